@@ -1,21 +1,55 @@
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from functools import lru_cache
+from typing import Optional, Tuple
 import jwt
-from passlib.context import CryptContext
 from fastapi import HTTPException, status
 import os
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes made with any other cost are flagged for rehash on the next successful login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+@lru_cache(maxsize=None)
+def pwd_context():
+    # passlib and its bcrypt backend load on the first hash, not when the app is imported
+    from passlib.context import CryptContext
+
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__rounds=BCRYPT_ROUNDS,
+        bcrypt__min_rounds=BCRYPT_ROUNDS,
+        bcrypt__max_rounds=BCRYPT_ROUNDS
+    )
 
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
+# Signed-claims mode: tokens also carry these user fields so requests can skip the users lookup.
+# Changes to them (e.g. revoking admin) only take effect once the user's token is reissued.
+TOKEN_USER_CLAIMS = os.getenv("TOKEN_USER_CLAIMS", "false").lower() == "true"
+USER_CLAIMS = ("email", "name", "is_admin")
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
+
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    # Returns (valid, new_hash); new_hash is set when the stored hash should be replaced
+    return pwd_context().verify_and_update(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
+
+def user_token_data(user: dict) -> dict:
+    data = {"user_id": user['id']}
+    if TOKEN_USER_CLAIMS:
+        data.update({claim: user.get(claim) for claim in USER_CLAIMS})
+    return data
+
+def user_from_claims(payload: dict) -> Optional[dict]:
+    if not TOKEN_USER_CLAIMS or not all(claim in payload for claim in USER_CLAIMS):
+        return None
+    return {"id": payload['user_id'], **{claim: payload[claim] for claim in USER_CLAIMS}}
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
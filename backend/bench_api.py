@@ -0,0 +1,297 @@
+"""End-to-end API benchmark with per-route latency and regression thresholds.
+
+    python bench_api.py [--scenarios browse,search,cart,checkout,login] [--duration 10] [--concurrency 32]
+                        [--memory | --url http://localhost:8001] [--baseline bench.json] [--save-baseline bench.json]
+
+By default the app from server.py is driven in process against the mongod
+in MONGO_URL, in a scratch database (bench_<random>, dropped afterwards)
+seeded with --products generated products. --memory uses mongomock-motor
+instead (pip install mongomock-motor); it is handy for checking the harness
+but is not a real database. Bulk writes and some aggregation stages don't
+work there, so the checkout and cart scenarios are skipped. --url drives a running
+server and uses whatever catalog it already has; checkout then takes real
+stock.
+
+Each scenario runs alone for --duration seconds with --concurrency workers.
+For every route the script prints request count, throughput and
+p50/p95/p99. With --baseline it exits non-zero when a route's p95 grows past
+--max-ratio (or --slack-ms, whichever allows more), when its throughput
+falls below the baseline divided by --max-ratio, or when more than
+--max-error-rate of requests fail (5xx, transport errors, or a successful
+response whose body is wrong, such as a hydrated cart without prices). With
+--save-baseline it writes the run's numbers for later comparison. --seed
+makes the request mix repeatable.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+import httpx
+
+SCENARIOS = ["browse", "search", "cart", "checkout", "login"]
+
+WORDS = [
+    "battery", "display", "screen", "charging", "port", "camera", "keyboard", "housing", "speaker", "flex",
+    "original", "replacement", "oled", "amoled", "lcd", "touch", "back", "panel", "glass", "module"
+]
+CATEGORIES = ["Battery", "Display & Screens", "Body & Housings", "Charging Port", "Camera", "Laptop Keyboard"]
+BRANDS = ["Samsung", "Apple", "Xiaomi", "OnePlus", "Realme", "Dell", "HP", "Lenovo"]
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def generate_products(count: int, rng: random.Random) -> list:
+    from datetime import datetime, timedelta, timezone
+
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    products = []
+    for i in range(count):
+        brand, category = rng.choice(BRANDS), rng.choice(CATEGORIES)
+        price = float(rng.choice([299, 499, 899, 1499, 2999, 5999, 12999]))
+        products.append({
+            "id": f"bench-{i}",
+            "name": f"{brand} {' '.join(rng.sample(WORDS, 3))} {i}",
+            "description": " ".join(rng.choices(WORDS, k=20)),
+            "category": category,
+            "brand": brand,
+            "price": price,
+            "discount_price": price * 0.8 if i % 3 == 0 else None,
+            "image": "https://images.example.com/bench.jpg",
+            "stock": 10 ** 6,
+            "rating": 0.0,
+            "reviews_count": 0,
+            "created_at": start + timedelta(minutes=i)
+        })
+    return products
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.rejected = defaultdict(int)
+
+    async def call(self, client: httpx.AsyncClient, route: str, method: str, url: str, check=None, **kwargs):
+        """`check`, if given, is called with a 2xx response's JSON; a falsy result counts as an error."""
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            response = None
+        self.latencies[route].append((time.perf_counter() - start) * 1000)
+        if response is None or response.status_code >= 500:
+            self.errors[route] += 1
+        elif response.status_code < 300 and check and not check(response.json()):
+            self.errors[route] += 1
+        elif response.status_code >= 400:
+            self.rejected[route] += 1
+        return response
+
+class Session:
+    """What the scenarios need to know about the target: the client, users and product ids."""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.users = []
+        self.product_ids = []
+
+    async def prepare(self, users: int):
+        for _ in range(users):
+            credentials = {"email": f"bench-{uuid.uuid4().hex[:12]}@example.com", "password": uuid.uuid4().hex}
+            response = await self.client.post("/api/auth/register", json={**credentials, "name": "Bench User"})
+            response.raise_for_status()
+            self.users.append((credentials, {"Authorization": f"Bearer {response.json()['access_token']}"}))
+        response = await self.client.get("/api/products", params={"limit": 1000})
+        response.raise_for_status()
+        self.product_ids = [product['id'] for product in response.json()]
+        if not self.product_ids:
+            raise SystemExit("No products to benchmark against; seed the database first")
+
+async def browse(session: Session, recorder: Recorder, rng: random.Random):
+    client = session.client
+    await recorder.call(client, "GET /api/products", "GET", "/api/products", params={"limit": 24})
+    await recorder.call(client, "GET /api/products?category", "GET", "/api/products",
+                        params={"category": rng.choice(CATEGORIES), "limit": 24})
+    await recorder.call(client, "GET /api/products/facets", "GET", "/api/products/facets",
+                        params={"brand": rng.choice(BRANDS)})
+    await recorder.call(client, "GET /api/products/{id}", "GET", f"/api/products/{rng.choice(session.product_ids)}")
+    await recorder.call(client, "GET /api/categories", "GET", "/api/categories")
+
+async def search(session: Session, recorder: Recorder, rng: random.Random):
+    terms = " ".join(rng.sample(WORDS, rng.randint(1, 2)))
+    if rng.random() < 0.3:
+        terms = terms[:-1]  # prefix / typo-ish query
+    await recorder.call(session.client, "GET /api/products?search", "GET", "/api/products",
+                        params={"search": terms, "limit": 24})
+
+async def cart(session: Session, recorder: Recorder, rng: random.Random):
+    _, headers = rng.choice(session.users)
+    product_id = rng.choice(session.product_ids)
+    client = session.client
+    await recorder.call(client, "POST /api/cart/add", "POST", "/api/cart/add", headers=headers,
+                        json={"product_id": product_id, "quantity": rng.randint(1, 3)})
+    # The line just added must come back priced, or the join isn't doing its job
+    await recorder.call(client, "GET /api/cart?hydrate", "GET", "/api/cart", headers=headers, params={"hydrate": True},
+                        check=lambda body: body.get('items') and (body.get('subtotal') or 0) > 0 and (body.get('total') or 0) > 0)
+    await recorder.call(client, "POST /api/cart/remove", "POST", "/api/cart/remove", headers=headers,
+                        params={"product_id": product_id})
+
+async def checkout(session: Session, recorder: Recorder, rng: random.Random):
+    _, headers = rng.choice(session.users)
+    items = [{"product_id": pid, "quantity": 1} for pid in rng.sample(session.product_ids, rng.randint(1, 3))]
+    await recorder.call(session.client, "POST /api/orders/create", "POST", "/api/orders/create", headers=headers,
+                        json={"items": items, "shipping_address": {"name": "Bench", "city": "Pune", "pincode": "411001"}})
+
+async def login(session: Session, recorder: Recorder, rng: random.Random):
+    credentials, _ = rng.choice(session.users)
+    await recorder.call(session.client, "POST /api/auth/login", "POST", "/api/auth/login", json=credentials)
+
+async def run_scenario(name: str, session: Session, args) -> dict:
+    action = globals()[name]
+    recorder = Recorder()
+    deadline = time.perf_counter() + args.duration
+
+    async def worker(worker_id: int):
+        rng = random.Random(f"{args.seed}-{name}-{worker_id}")
+        while time.perf_counter() < deadline:
+            await action(session, recorder, rng)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    routes = {}
+    for route, samples in recorder.latencies.items():
+        count = len(samples)
+        routes[route] = {
+            "requests": count,
+            "rps": round(count / elapsed, 1),
+            "p50": round(percentile(samples, 50), 2),
+            "p95": round(percentile(samples, 95), 2),
+            "p99": round(percentile(samples, 99), 2),
+            "errors": recorder.errors[route],
+            "rejected": recorder.rejected[route]
+        }
+    return routes
+
+def print_routes(name: str, routes: dict):
+    print(f"{name}")
+    print(f"  {'route':<30} {'n':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'err':>5} {'4xx':>5}")
+    for route, r in sorted(routes.items()):
+        print(f"  {route:<30} {r['requests']:>7} {r['rps']:>8.1f} {r['p50']:>8.1f} {r['p95']:>8.1f} "
+              f"{r['p99']:>8.1f} {r['errors']:>5} {r['rejected']:>5}")
+
+def regressions(results: dict, baseline: dict, args) -> list:
+    failures = []
+    for route, current in results.items():
+        if current['requests'] and current['errors'] / current['requests'] > args.max_error_rate:
+            failures.append(f"{route}: {current['errors']} of {current['requests']} requests failed")
+        base = baseline.get(route)
+        if not base:
+            continue
+        limit = max(base['p95'] * args.max_ratio, base['p95'] + args.slack_ms)
+        if current['p95'] > limit:
+            failures.append(f"{route}: p95 {current['p95']:.1f} ms > {limit:.1f} ms (baseline {base['p95']:.1f} ms)")
+        if current['rps'] < base['rps'] / args.max_ratio:
+            failures.append(f"{route}: {current['rps']:.1f} req/s < {base['rps'] / args.max_ratio:.1f} "
+                            f"(baseline {base['rps']:.1f})")
+    return failures
+
+async def run(args) -> bool:
+    rng = random.Random(args.seed)
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+        lifespan = None
+        db = None
+    else:
+        os.environ['DB_NAME'] = f"bench_{uuid.uuid4().hex[:8]}"
+        if args.memory:
+            os.environ.setdefault('MONGO_URL', "mongodb://localhost:27017")
+        # Every simulated user shares one client address; measure the app, not the admission limits
+        os.environ.setdefault('RATE_LIMITS_ENABLED', "false")
+        os.environ.setdefault('MAX_CONCURRENT_REQUESTS', "0")
+        import server
+
+        if args.memory:
+            from mongomock_motor import AsyncMongoMockClient
+
+            mongo = AsyncMongoMockClient(tz_aware=True)
+        else:
+            mongo = server.connect_mongo()
+        # Seed before startup so the search index is built with the products; the app reuses this client
+        server.connect_mongo = lambda: mongo
+        db = mongo[os.environ['DB_NAME']]
+        await db.products.insert_many(generate_products(args.products, rng))
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench", timeout=60)
+        # ASGITransport doesn't send lifespan events; run startup (indexes, search index) ourselves
+        lifespan = server.app.router.lifespan_context(server.app)
+        await lifespan.__aenter__()
+
+    results = {}
+    try:
+        async with client:
+            session = Session(client)
+            await session.prepare(args.users)
+            for name in args.scenarios:
+                if name == "checkout" and args.memory:
+                    print("checkout: skipped with --memory (needs bulk_write)")
+                    continue
+                if name == "cart" and args.memory:
+                    print("cart: skipped with --memory (mongomock doesn't evaluate the hydrated cart pipeline)")
+                    continue
+                routes = await run_scenario(name, session, args)
+                print_routes(name, routes)
+                results.update(routes)
+    finally:
+        # Shutdown closes the client, so drop the scratch database first
+        if db is not None and not args.memory:
+            await db.client.drop_database(db.name)
+        if lifespan:
+            await lifespan.__aexit__(None, None, None)
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(results, indent=2, sort_keys=True))
+        print(f"Baseline written to {args.save_baseline}")
+
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else {}
+    failures = regressions(results, baseline, args)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if not failures:
+        print("PASS")
+    return not failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="Base URL of a running server")
+    target.add_argument("--memory", action="store_true", help="Use mongomock-motor instead of MONGO_URL")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        type=lambda value: [name for name in value.split(",") if name])
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", help="JSON from an earlier --save-baseline run to compare against")
+    parser.add_argument("--save-baseline")
+    parser.add_argument("--max-ratio", type=float, default=1.5)
+    parser.add_argument("--slack-ms", type=float, default=10.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Compare list-endpoint cost with ISO-string timestamps vs native datetimes.
+
+    python bench_datetimes.py [--orders 1000] [--mongo]
+
+"before" is the old read path: string created_at converted with
+datetime.fromisoformat per row, then validated and serialized through
+List[Order] as FastAPI does. "after" skips the conversion loop because the
+driver already returns datetimes. With --mongo (MONGO_URL and DB_NAME from
+.env) the documents are also read back from scratch collections so the
+timings include the driver decode.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from pydantic import TypeAdapter
+
+from models import Order
+
+ORDERS = TypeAdapter(List[Order])
+
+def generate_orders(count: int) -> list:
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [{
+        "id": str(uuid.uuid4()),
+        "user_id": f"user-{i % 50}",
+        "items": [
+            {"product_id": f"prod-{j}", "product_name": f"Spare part {j}", "quantity": 1 + j % 3, "price": 999.0 + j}
+            for j in range(3)
+        ],
+        "total_amount": 4000.0 + i,
+        "payment_status": "success",
+        "order_status": "processing",
+        "shipping_address": {"name": "Bench", "city": "Pune", "pincode": "411001"},
+        "created_at": start + timedelta(minutes=i)
+    } for i in range(count)]
+
+def as_iso_strings(orders: list) -> list:
+    return [{**order, "created_at": order['created_at'].isoformat()} for order in orders]
+
+def render_before(orders: list) -> bytes:
+    for order in orders:
+        if isinstance(order.get('created_at'), str):
+            order['created_at'] = datetime.fromisoformat(order['created_at'])
+    return ORDERS.dump_json(ORDERS.validate_python(orders))
+
+def render_after(orders: list) -> bytes:
+    return ORDERS.dump_json(ORDERS.validate_python(orders))
+
+def report(label: str, samples: list):
+    samples = sorted(samples)
+    p95 = samples[max(0, int(len(samples) * 0.95) - 1)]
+    print(f"  {label:<10} mean {statistics.mean(samples):8.2f} ms   p95 {p95:8.2f} ms")
+
+def run_in_process(orders: list, repeat: int):
+    iso_orders = as_iso_strings(orders)
+    before, after = [], []
+    for _ in range(repeat):
+        # The conversion loop mutates its input, so each run gets fresh copies
+        batch = [dict(order) for order in iso_orders]
+        start = time.perf_counter()
+        render_before(batch)
+        before.append((time.perf_counter() - start) * 1000)
+
+        batch = [dict(order) for order in orders]
+        start = time.perf_counter()
+        render_after(batch)
+        after.append((time.perf_counter() - start) * 1000)
+
+    print(f"{len(orders)} orders per response, {repeat} runs (in process)")
+    report("before", before)
+    report("after", after)
+
+async def run_against_mongo(orders: list, repeat: int):
+    from server import connect_mongo
+
+    db = connect_mongo()[os.environ['DB_NAME']]
+
+    iso_collection, native_collection = db.bench_orders_iso, db.bench_orders_native
+    await iso_collection.drop()
+    await native_collection.drop()
+    await iso_collection.insert_many(as_iso_strings(orders))
+    await native_collection.insert_many([dict(order) for order in orders])
+
+    before, after = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render_before(await iso_collection.find({}, {"_id": 0}).to_list(None))
+        before.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        render_after(await native_collection.find({}, {"_id": 0}).to_list(None))
+        after.append((time.perf_counter() - start) * 1000)
+
+    await iso_collection.drop()
+    await native_collection.drop()
+
+    print(f"{len(orders)} orders per response, {repeat} runs (against Mongo)")
+    report("before", before)
+    report("after", after)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--mongo", action="store_true")
+    args = parser.parse_args()
+
+    orders = generate_orders(args.orders)
+    if args.mongo:
+        asyncio.run(run_against_mongo(orders, args.repeat))
+    else:
+        run_in_process(orders, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Measure /api/products latency while a storm of logins runs.
+
+    python bench_login_storm.py [--url http://localhost:8001] [--logins 400] [--concurrency 50]
+
+Without --url the app from server.py is driven in process (MONGO_URL and
+DB_NAME from .env must point at a reachable database). The script registers
+a throwaway user, samples /api/products alone, then samples it again while
+logins hammer bcrypt, and fails if p99 grows by more than --max-ratio
+(or --slack-ms, whichever allows more, so sub-millisecond baselines are not
+held to a ratio of noise).
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import uuid
+
+import httpx
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def summary(label: str, samples: list):
+    print(f"  {label:<22} n={len(samples):<5} p50 {percentile(samples, 50):7.1f} ms   "
+          f"p99 {percentile(samples, 99):7.1f} ms   max {max(samples):7.1f} ms")
+
+async def probe_products(client: httpx.AsyncClient, stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        response = await client.get("/api/products", params={"limit": 12})
+        samples.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+        await asyncio.sleep(0.01)
+
+async def login_worker(client: httpx.AsyncClient, credentials: dict, remaining: list, latencies: list):
+    while remaining:
+        remaining.pop()
+        start = time.perf_counter()
+        response = await client.post("/api/auth/login", json=credentials)
+        latencies.append((time.perf_counter() - start) * 1000)
+        response.raise_for_status()
+
+async def run(args) -> bool:
+    lifespan = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        # The storm is one client hammering login; measure the app, not the admission limits
+        os.environ.setdefault('RATE_LIMITS_ENABLED', "false")
+        os.environ.setdefault('MAX_CONCURRENT_REQUESTS', "0")
+        from server import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+        # ASGITransport doesn't send lifespan events; start the app (Mongo client, indexes) ourselves
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+
+    try:
+        async with client:
+            credentials = {"email": f"bench-{uuid.uuid4().hex[:12]}@example.com", "password": uuid.uuid4().hex}
+            response = await client.post("/api/auth/register", json={**credentials, "name": "Bench User"})
+            response.raise_for_status()
+
+            baseline = []
+            stop = asyncio.Event()
+            probe = asyncio.create_task(probe_products(client, stop, baseline))
+            await asyncio.sleep(args.baseline_seconds)
+            stop.set()
+            await probe
+
+            during, logins = [], []
+            stop = asyncio.Event()
+            probe = asyncio.create_task(probe_products(client, stop, during))
+            remaining = list(range(args.logins))
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                login_worker(client, credentials, remaining, logins) for _ in range(args.concurrency)
+            ))
+            elapsed = time.perf_counter() - start
+            stop.set()
+            await probe
+    finally:
+        if lifespan:
+            await lifespan.__aexit__(None, None, None)
+
+    print(f"Login storm: {len(logins)} logins in {elapsed:.1f} s ({len(logins) / elapsed:.1f}/s), "
+          f"mean {statistics.mean(logins):.0f} ms")
+    summary("products (baseline)", baseline)
+    summary("products (storm)", during)
+    summary("login", logins)
+
+    base_p99, storm_p99 = percentile(baseline, 99), percentile(during, 99)
+    limit = max(base_p99 * args.max_ratio, base_p99 + args.slack_ms)
+    print(f"products p99 during storm: {storm_p99:.1f} ms (limit {limit:.1f} ms)")
+    return storm_p99 <= limit
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server; omit to run the app in process")
+    parser.add_argument("--logins", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--baseline-seconds", type=float, default=5.0)
+    parser.add_argument("--max-ratio", type=float, default=3.0)
+    parser.add_argument("--slack-ms", type=float, default=25.0)
+    args = parser.parse_args()
+
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Fire thousands of parallel orders at a few products with limited stock.
+
+    python bench_order_storm.py [--url http://localhost:8001] [--orders 2000] [--concurrency 200] [--stock 50]
+
+Products are seeded straight into the database from .env (MONGO_URL and
+DB_NAME), so with --url the server must use the same database; without it
+the app from server.py is driven in process. Every order asks for one or two
+random products. Afterwards the script checks that stock never went
+negative, that the units sold by successful orders match the stock taken,
+that no hold tags were left behind and that every failure was a 409. It
+exits non-zero if any check fails, and removes everything it created.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+
+import httpx
+
+async def place_order(client: httpx.AsyncClient, headers: dict, product_ids: list, remaining: list, results: list):
+    while remaining:
+        remaining.pop()
+        items = [{"product_id": pid, "quantity": random.randint(1, 2)} for pid in random.sample(product_ids, random.randint(1, 2))]
+        start = time.perf_counter()
+        response = await client.post(
+            "/api/orders/create", headers=headers,
+            json={"items": items, "shipping_address": {"name": "Bench", "city": "Pune", "pincode": "411001"}}
+        )
+        results.append((response.status_code, (time.perf_counter() - start) * 1000, response.json()))
+
+async def run(args) -> bool:
+    if not args.url:
+        # All orders come from one client; measure stock contention, not the admission limits
+        os.environ.setdefault('RATE_LIMITS_ENABLED', "false")
+        os.environ.setdefault('MAX_CONCURRENT_REQUESTS', "0")
+    import server
+    # After server, which loads .env, so tokens are signed with the configured JWT_SECRET_KEY
+    from auth import create_access_token
+    from stats import rebuild_stats
+
+    mongo = server.connect_mongo()
+    db = mongo[os.environ['DB_NAME']]
+
+    run_id = uuid.uuid4().hex[:12]
+    product_ids = [f"bench-{run_id}-{i}" for i in range(args.products)]
+    user_id = f"bench-{run_id}"
+    await db.users.insert_one({"id": user_id, "email": f"{user_id}@example.com", "name": "Bench User", "is_admin": False})
+    await db.products.insert_many([{
+        "id": pid, "name": f"Bench part {i}", "description": "Order storm", "category": "Bench", "brand": "Bench",
+        "price": 100.0, "discount_price": None, "image": "", "stock": args.stock, "rating": 0.0, "reviews_count": 0
+    } for i, pid in enumerate(product_ids)])
+
+    lifespan = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120)
+    else:
+        server.connect_mongo = lambda: mongo
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench", timeout=120)
+        # ASGITransport doesn't send lifespan events; start the app (client, workers) ourselves
+        lifespan = server.app.router.lifespan_context(server.app)
+        await lifespan.__aenter__()
+    headers = {"Authorization": f"Bearer {create_access_token({'user_id': user_id})}"}
+
+    results = []
+    try:
+        async with client:
+            remaining = list(range(args.orders))
+            start = time.perf_counter()
+            await asyncio.gather(*(
+                place_order(client, headers, product_ids, remaining, results) for _ in range(args.concurrency)
+            ))
+            elapsed = time.perf_counter() - start
+
+        products = await db.products.find({"id": {"$in": product_ids}}, {"_id": 0}).to_list(None)
+        orders = await db.orders.find({"user_id": user_id}, {"_id": 0, "items": 1}).to_list(None)
+    finally:
+        await db.products.delete_many({"id": {"$in": product_ids}})
+        await db.orders.delete_many({"user_id": user_id})
+        await db.users.delete_one({"id": user_id})
+        await rebuild_stats(db)
+        if lifespan:
+            await lifespan.__aexit__(None, None, None)
+
+    statuses = Counter(code for code, _, _ in results)
+    latencies = sorted(ms for _, ms, _ in results)
+    sold = Counter()
+    for order in orders:
+        for item in order['items']:
+            sold[item['product_id']] += item['quantity']
+
+    print(f"{len(results)} orders in {elapsed:.1f} s ({len(results) / elapsed:.0f}/s), "
+          f"p50 {latencies[len(latencies) // 2]:.0f} ms, p99 {latencies[int(len(latencies) * 0.99)]:.0f} ms")
+    print(f"  responses: {dict(statuses)}")
+
+    ok = True
+    for product in products:
+        taken = args.stock - product['stock']
+        print(f"  {product['id']}: stock {product['stock']}, taken {taken}, sold {sold[product['id']]}")
+        if product['stock'] < 0 or taken != sold[product['id']] or product.get('stock_holds'):
+            ok = False
+    if statuses[200] != len(orders) or set(statuses) - {200, 409}:
+        ok = False
+    print("PASS" if ok else "FAIL: oversold, leaked stock or unexpected responses")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server on the same database; omit to run the app in process")
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--products", type=int, default=3)
+    parser.add_argument("--stock", type=int, default=50)
+    args = parser.parse_args()
+
+    sys.exit(0 if asyncio.run(run(args)) else 1)
+
+if __name__ == "__main__":
+    main()
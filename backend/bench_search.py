@@ -0,0 +1,127 @@
+"""Compare the in-memory search index with the old `$regex` name scan.
+
+    python bench_search.py [--products 100000] [--mongo]
+
+Without --mongo the regex path is measured as an in-process scan over the
+product names, which is a lower bound on what Mongo does for an unindexed
+`$regex`. With --mongo (MONGO_URL and DB_NAME from .env) both paths are run
+against a scratch `bench_products` collection.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import re
+import statistics
+import time
+
+from search import ProductSearchIndex
+
+BRANDS = ["Samsung", "Apple", "Xiaomi", "OnePlus", "Realme", "Vivo", "OPPO", "Dell", "HP", "Lenovo"]
+CATEGORIES = ["Battery", "Display & Screens", "Body & Housings", "Charging Port", "Camera",
+              "Laptop Screen", "Laptop Keyboard", "Laptop Battery"]
+PARTS = ["LCD with Touch Screen", "Battery", "Back Panel", "Charging Port Flex", "Rear Camera",
+         "Keyboard", "Display Assembly", "Speaker", "Vibrator Motor", "SIM Tray"]
+MODELS = ["Galaxy S21", "iPhone 12", "Redmi Note 10 Pro", "Nord CE", "Narzo 50", "Y20",
+          "Reno 6", "Inspiron 15", "Pavilion 14", "ThinkPad T480"]
+QUERIES = ["samsung", "battery", "galaxy s21 display", "iphone", "iphnoe", "batt", "thinkpad keyboard",
+           "redmi note", "charging port", "speakr", "pavilion"]
+
+def generate_products(count: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    products = []
+    for i in range(count):
+        brand = rng.choice(BRANDS)
+        part = rng.choice(PARTS)
+        model = rng.choice(MODELS)
+        products.append({
+            "id": f"bench-{i}",
+            "name": f"{part} for {brand} {model} v{i % 97}",
+            "description": f"Replacement {part.lower()} compatible with {brand} {model}. Batch {i}.",
+            "category": rng.choice(CATEGORIES),
+            "brand": brand,
+            "price": round(rng.uniform(199, 14999), 2),
+        })
+    return products
+
+def timed(fn, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def report(label: str, samples: list):
+    samples = sorted(samples)
+    p95 = samples[max(0, int(len(samples) * 0.95) - 1)]
+    print(f"  {label:<28} mean {statistics.mean(samples):8.3f} ms   p95 {p95:8.3f} ms")
+
+def run_in_process(products: list, repeat: int, limit: int):
+    index = ProductSearchIndex()
+    start = time.perf_counter()
+    for product in products:
+        index.add(product)
+    print(f"Built index over {len(index)} products in {time.perf_counter() - start:.2f} s")
+
+    for query in QUERIES:
+        pattern = re.compile(re.escape(query), re.IGNORECASE)
+        regex_hits = sum(1 for p in products if pattern.search(p['name']))
+        index_hits = len(index.search(query))
+        print(f"\n'{query}': regex {regex_hits} matches, index {index_hits} matches")
+        report("regex scan (in-process)", timed(
+            lambda: list(itertools.islice((p for p in products if pattern.search(p['name'])), limit)), repeat))
+        report("index", timed(lambda: index.search(query, limit=limit), repeat))
+
+async def run_against_mongo(products: list, repeat: int, limit: int):
+    from server import connect_mongo
+
+    db = connect_mongo()[os.environ['DB_NAME']]
+
+    collection = db.bench_products
+    await collection.drop()
+    for i in range(0, len(products), 10000):
+        await collection.insert_many([dict(p) for p in products[i:i + 10000]])
+    await collection.create_index("id", unique=True)
+
+    index = ProductSearchIndex()
+    for product in products:
+        index.add(product)
+
+    async def atimed(coro_fn) -> list:
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await coro_fn()
+            samples.append((time.perf_counter() - start) * 1000)
+        return samples
+
+    for query in QUERIES:
+        print(f"\n'{query}'")
+        report("mongo $regex", await atimed(lambda: collection.find(
+            {"name": {"$regex": query, "$options": "i"}}, {"_id": 0}).limit(limit).to_list(limit)))
+
+        async def via_index():
+            ids = index.search(query, limit=limit)
+            await collection.find({"id": {"$in": ids}}, {"_id": 0}).to_list(limit)
+        report("index + mongo $in", await atimed(via_index))
+
+    await collection.drop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--mongo", action="store_true")
+    args = parser.parse_args()
+
+    products = generate_products(args.products)
+    if args.mongo:
+        asyncio.run(run_against_mongo(products, args.repeat, args.limit))
+    else:
+        run_in_process(products, args.repeat, args.limit)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Per-route serialization cost for list responses.
+
+    python bench_serialization.py [--rows 1000] [--repeat 50]
+
+For each list route's model, times three ways of turning trusted documents
+into response bytes:
+
+  validated   response_model validation + Pydantic dump_json (FastAPI default)
+  jsonable    jsonable_encoder + json.dumps (FastAPI's path for plain returns)
+  fast        serialization.list_response: fill defaults + orjson
+"""
+import argparse
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from models import Order, Product, Review
+from serialization import list_response
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def product_doc(i: int) -> dict:
+    return {
+        "id": str(uuid.uuid4()), "name": f"Battery for Phone {i}", "description": "Replacement part " * 8,
+        "category": "Battery", "brand": "Samsung", "price": 1999.0, "discount_price": 1499.0,
+        "image": "https://images.example.com/p.jpg", "stock": 25, "rating": 4.5, "reviews_count": 12,
+        "created_at": START + timedelta(minutes=i)
+    }
+
+def order_doc(i: int) -> dict:
+    return {
+        "id": str(uuid.uuid4()), "user_id": f"user-{i % 50}",
+        "items": [{"product_id": f"prod-{j}", "product_name": f"Part {j}", "quantity": 1, "price": 999.0} for j in range(3)],
+        "total_amount": 2997.0, "payment_id": None, "payment_status": "success", "order_status": "processing",
+        "shipping_address": {"name": "Bench", "city": "Pune", "pincode": "411001"},
+        "created_at": START + timedelta(minutes=i)
+    }
+
+def review_doc(i: int) -> dict:
+    return {
+        "id": str(uuid.uuid4()), "product_id": "prod-1", "user_id": f"user-{i}", "user_name": "Bench User",
+        "rating": 1 + i % 5, "comment": "Works as described. " * 4, "created_at": START + timedelta(minutes=i)
+    }
+
+ROUTES = [
+    ("GET /api/products", Product, product_doc),
+    ("GET /api/orders, /api/admin/orders", Order, order_doc),
+    ("GET /api/reviews/{product_id}", Review, review_doc),
+]
+
+def time_ms(fn, docs: list, repeat: int) -> list:
+    samples = []
+    for _ in range(repeat):
+        batch = [dict(doc) for doc in docs]
+        start = time.perf_counter()
+        fn(batch)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    for route, model, make_doc in ROUTES:
+        docs = [make_doc(i) for i in range(args.rows)]
+        adapter = TypeAdapter(List[model])
+        paths = {
+            "validated": lambda batch: adapter.dump_json(adapter.validate_python(batch)),
+            "jsonable": lambda batch: json.dumps(jsonable_encoder(adapter.validate_python(batch))).encode(),
+            "fast": lambda batch: list_response(Response(), batch, model).body,
+        }
+        print(f"{route} ({model.__name__}, {args.rows} rows)")
+        for label, fn in paths.items():
+            samples = time_ms(fn, docs, args.repeat)
+            print(f"  {label:<10} mean {statistics.mean(samples):7.2f} ms   "
+                  f"per row {statistics.mean(samples) / args.rows * 1000:6.2f} us")
+
+if __name__ == "__main__":
+    main()
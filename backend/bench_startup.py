@@ -0,0 +1,114 @@
+"""Measure how long `import server` takes and fail when it exceeds the budget.
+
+    python bench_startup.py [--runs 5] [--budget-ms 700] [--budget-ratio 2.0] [--top 15]
+
+Each run imports the app in a fresh interpreter under `python -X importtime`
+and the median cumulative time of the `server` module is compared with the
+budget (STARTUP_BUDGET_MS, to allow for slower machines). The same median is
+also compared with the time FastAPI alone takes to import in that run; that
+ratio barely moves with machine load, so the test suite checks it instead of
+wall-clock time. Interpreter startup (site, .pth files) is not counted. It also fails
+if any module that should only load on first use (password hashing, the
+payment gateway's HTTP client, the Mongo driver's async wrapper) was imported,
+since that is how cold-start regressions usually creep back in. Exits 1 on
+failure, so CI can run it next to the other checks.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+# Budget for the median cumulative import time of server.py
+IMPORT_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "700"))
+# ...and for that time as a multiple of importing fastapi, measured in the same run
+IMPORT_BUDGET_RATIO = 2.0
+REFERENCE_MODULE = "fastapi"
+# Imported on first use only; none of these may be loaded by `import server`
+LAZY_MODULES = ("passlib", "bcrypt", "httpx", "motor")
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+def import_once() -> tuple:
+    """Import server in a fresh interpreter; returns (importtime rows, lazy modules that were loaded)."""
+    code = (
+        "import sys, json, server; "
+        f"print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+    )
+    # No Mongo or gateway settings are needed just to import the app
+    env = {key: value for key, value in os.environ.items() if not key.startswith(("MONGO_", "RAZORPAY_"))}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=Path(__file__).parent, env=env, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, len(indent) // 2, int(self_us) / 1000, int(cumulative_us) / 1000))
+    return rows, json.loads(result.stdout.strip().splitlines()[-1])
+
+def server_import_ms(rows: list) -> float:
+    """Cumulative import time of the top-level `server` module in one run's rows."""
+    return next(cumulative for module, depth, _, cumulative in rows if module == "server" and depth == 0)
+
+def reference_ratio(rows: list) -> float:
+    """`server` import time over the time its REFERENCE_MODULE import took in the same run."""
+    reference = next(cumulative for module, depth, _, cumulative in rows if module == REFERENCE_MODULE)
+    return server_import_ms(rows) / reference
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--budget-ratio", type=float, default=IMPORT_BUDGET_RATIO,
+                        help=f"Budget as a multiple of importing {REFERENCE_MODULE}")
+    parser.add_argument("--top", type=int, default=15, help="Slowest direct imports of server.py to list")
+    args = parser.parse_args()
+
+    # The first import also writes .pyc files; don't count it
+    import_once()
+    totals, ratios, runs, loaded = [], [], [], set()
+    for _ in range(args.runs):
+        rows, lazy_loaded = import_once()
+        loaded.update(lazy_loaded)
+        totals.append(server_import_ms(rows))
+        ratios.append(reference_ratio(rows))
+        runs.append(rows)
+
+    median = statistics.median(totals)
+    ratio = statistics.median(ratios)
+    print(f"import server: median {median:.0f} ms over {args.runs} runs "
+          f"(min {min(totals):.0f}, max {max(totals):.0f}), budget {args.budget_ms:.0f} ms")
+    print(f"  {ratio:.2f}x the {REFERENCE_MODULE} import, budget {args.budget_ratio:.2f}x")
+
+    # Direct imports of server.py from the median run, slowest first. importtime lists a
+    # module's imports before the module itself, after the previous top-level entry.
+    rows = runs[totals.index(sorted(totals)[len(totals) // 2])]
+    end = next(i for i, (module, depth, _, _) in enumerate(rows) if module == "server" and depth == 0)
+    start = max((i for i in range(end) if rows[i][1] == 0), default=-1) + 1
+    direct = sorted(((cumulative, module) for module, depth, _, cumulative in rows[start:end] if depth == 1),
+                    reverse=True)
+    for cumulative, module in direct[:args.top]:
+        print(f"  {cumulative:8.1f} ms  {module}")
+
+    ok = True
+    if loaded:
+        print(f"FAIL: loaded at import, expected on first use: {', '.join(sorted(loaded))}")
+        ok = False
+    if median > args.budget_ms:
+        print(f"FAIL: {median:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+        ok = False
+    if ratio > args.budget_ratio:
+        print(f"FAIL: {ratio:.2f}x {REFERENCE_MODULE} is over the {args.budget_ratio:.2f}x budget")
+        ok = False
+    if ok:
+        print("PASS")
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import uuid
+
+# Orders below the threshold pay a flat delivery charge
+FREE_DELIVERY_THRESHOLD = 500
+DELIVERY_CHARGE = 40
+
+def delivery_charge(subtotal: float) -> float:
+    return 0 if subtotal >= FREE_DELIVERY_THRESHOLD else DELIVERY_CHARGE
+
+def unit_price(product: dict) -> float:
+    # A discount only applies when it's positive; 0 or a missing value means full price.
+    # hydrated_cart_pipeline prices the same way.
+    discount = product.get('discount_price')
+    return discount if discount and discount > 0 else product['price']
+
+def checkout_totals(subtotal: float) -> dict:
+    # What create_order will charge for this subtotal, so the cart page never prices it differently
+    # An empty cart has nothing to deliver
+    charge = delivery_charge(subtotal) if subtotal else 0
+    return {"delivery_charge": charge, "free_delivery_threshold": FREE_DELIVERY_THRESHOLD,
+            "total": subtotal + charge}
+
+def add_item_update(product_id: str, quantity: int, updated_at) -> list:
+    # Update pipeline: bump the line's quantity if the product is already in the cart,
+    # otherwise append it. Works on a missing cart too when used with upsert=True.
+    items = {"$ifNull": ["$items", []]}
+    product_id = {"$literal": product_id}  # never let an id be read as a field path
+    return [
+        {"$set": {
+            "id": {"$ifNull": ["$id", str(uuid.uuid4())]},
+            "items": {"$cond": [
+                {"$in": [product_id, {"$map": {"input": items, "in": "$$this.product_id"}}]},
+                {"$map": {
+                    "input": items,
+                    "in": {"$cond": [
+                        {"$eq": ["$$this.product_id", product_id]},
+                        {"product_id": "$$this.product_id", "quantity": {"$add": ["$$this.quantity", quantity]}},
+                        "$$this"
+                    ]}
+                }},
+                {"$concatArrays": [items, [{"product_id": product_id, "quantity": quantity}]]}
+            ]},
+            "updated_at": updated_at
+        }}
+    ]
+
+# Product fields copied onto hydrated cart lines
+CART_PRODUCT_FIELDS = ("name", "brand", "image", "price", "discount_price", "stock")
+
+def hydrated_cart_pipeline(user_id: str) -> list:
+    # One round trip: join the cart's lines to their products (indexed on products.id)
+    # and price them with the current catalogue. Lines keep the cart's order; a line whose
+    # product has been deleted comes back without product fields and is not priced.
+    # Null and missing sort below every number, so only a positive discount counts (as in unit_price).
+    discounted = {"$gt": ["$$product.discount_price", 0]}
+    price = {"$cond": [discounted, "$$product.discount_price", "$$product.price"]}
+    line = {
+        "product_id": "$$item.product_id",
+        "quantity": "$$item.quantity",
+        **{field: f"$$product.{field}" for field in CART_PRODUCT_FIELDS},
+        "unit_price": price,
+        "line_total": {"$multiply": [price, "$$item.quantity"]},
+        "line_discount": {"$cond": [
+            discounted,
+            {"$multiply": [{"$subtract": ["$$product.price", "$$product.discount_price"]}, "$$item.quantity"]},
+            0
+        ]},
+        "in_stock": {"$gte": [{"$ifNull": ["$$product.stock", 0]}, "$$item.quantity"]}
+    }
+    return [
+        {"$match": {"user_id": user_id}},
+        {"$lookup": {"from": "products", "localField": "items.product_id", "foreignField": "id", "as": "products"}},
+        {"$project": {
+            "_id": 0,
+            "id": 1,
+            "user_id": 1,
+            "updated_at": 1,
+            "items": {"$map": {
+                "input": {"$ifNull": ["$items", []]},
+                "as": "item",
+                "in": {"$let": {
+                    "vars": {"product": {"$arrayElemAt": [
+                        {"$filter": {"input": "$products", "cond": {"$eq": ["$$this.id", "$$item.product_id"]}}}, 0
+                    ]}},
+                    "in": line
+                }}
+            }}
+        }},
+        {"$set": {
+            "item_count": {"$sum": "$items.quantity"},
+            "subtotal": {"$sum": "$items.line_total"},
+            "discount": {"$sum": "$items.line_discount"}
+        }}
+    ]
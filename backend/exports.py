@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from typing import Optional
+
+EXPORT_BATCH_SIZE = 500
+
+ORDER_CSV_FIELDS = [
+    "id", "user_id", "created_at", "total_amount", "payment_id",
+    "payment_status", "order_status", "items", "shipping_address"
+]
+
+def _as_utc(value: datetime) -> datetime:
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+def order_export_query(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    order_status: Optional[str] = None,
+    payment_status: Optional[str] = None
+) -> dict:
+    query = {}
+    if start or end:
+        query['created_at'] = {}
+        if start:
+            query['created_at']['$gte'] = _as_utc(start)
+        if end:
+            query['created_at']['$lt'] = _as_utc(end)
+    if order_status:
+        query['order_status'] = order_status
+    if payment_status:
+        query['payment_status'] = payment_status
+    return query
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_default)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+async def ndjson_chunks(cursor):
+    lines = []
+    async for doc in cursor:
+        lines.append(json.dumps(doc, default=_json_default))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+async def csv_chunks(cursor, fields: list):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> str:
+        chunk = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return chunk
+
+    writer.writerow(fields)
+    yield flush()
+
+    rows = 0
+    async for doc in cursor:
+        writer.writerow([_csv_value(doc.get(f)) for f in fields])
+        rows += 1
+        if rows % EXPORT_BATCH_SIZE == 0:
+            yield flush()
+    if rows % EXPORT_BATCH_SIZE:
+        yield flush()
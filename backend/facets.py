@@ -0,0 +1,88 @@
+"""Filter counts for the product listing.
+
+Each facet is counted with every active filter except its own, so the
+category list still shows the other categories (and how many products each
+would give) once a category is picked. `total` applies all filters.
+"""
+from typing import Optional
+
+# Price bucket lower bounds; the last bucket is open-ended
+PRICE_BOUNDARIES = [0, 500, 1000, 2500, 5000, 10000]
+
+def facet_cache_key(
+    category: Optional[str] = None,
+    brand: Optional[str] = None,
+    search: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+) -> tuple:
+    # Equivalent filter sets share an entry: blank means unset, search is case- and space-insensitive
+    search = " ".join(search.lower().split()) if search else None
+    return (
+        category or None,
+        brand or None,
+        search or None,
+        float(min_price) if min_price is not None else None,
+        float(max_price) if max_price is not None else None
+    )
+
+def facet_pipeline(
+    category: Optional[str] = None,
+    brand: Optional[str] = None,
+    product_ids: Optional[list] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+) -> list:
+    filters = {}
+    if category:
+        filters['category'] = category
+    if brand:
+        filters['brand'] = brand
+    if min_price is not None or max_price is not None:
+        filters['price'] = {}
+        if min_price is not None:
+            filters['price']['$gte'] = min_price
+        if max_price is not None:
+            filters['price']['$lte'] = max_price
+
+    def without(field: str) -> dict:
+        return {key: value for key, value in filters.items() if key != field}
+
+    pipeline = [{"$match": {"id": {"$in": product_ids}}}] if product_ids is not None else []
+    pipeline.append({"$facet": {
+        "total": [{"$match": filters}, {"$count": "count"}],
+        "categories": [
+            {"$match": without("category")},
+            {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}}
+        ],
+        "brands": [
+            {"$match": without("brand")},
+            {"$group": {"_id": "$brand", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}}
+        ],
+        "price_ranges": [
+            {"$match": without("price")},
+            {"$bucket": {
+                "groupBy": "$price",
+                "boundaries": PRICE_BOUNDARIES + [float("inf")],
+                "default": "other",
+                "output": {"count": {"$sum": 1}}
+            }}
+        ]
+    }})
+    return pipeline
+
+def facet_result(facets: dict) -> dict:
+    """Shape the aggregation output for ProductFacets, listing empty price ranges too."""
+    bucket_counts = {bucket['_id']: bucket['count'] for bucket in facets.get('price_ranges', [])}
+    bounds = PRICE_BOUNDARIES + [None]
+    return {
+        "total": facets['total'][0]['count'] if facets.get('total') else 0,
+        "categories": [{"value": f['_id'], "count": f['count']} for f in facets.get('categories', []) if f['_id']],
+        "brands": [{"value": f['_id'], "count": f['count']} for f in facets.get('brands', []) if f['_id']],
+        "price_ranges": [
+            {"min": low, "max": high, "count": bucket_counts.get(low, 0)}
+            for low, high in zip(bounds, bounds[1:])
+        ]
+    }
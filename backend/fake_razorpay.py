@@ -0,0 +1,153 @@
+"""Local stand-in for the Razorpay orders API, for offline checkout load tests.
+
+    python fake_razorpay.py [--port 9090] [--latency-ms 150] [--jitter-ms 50] [--error-rate 0] [--hang-rate 0]
+
+Then start the backend with
+
+    RAZORPAY_API_URL=http://localhost:9090/v1 RAZORPAY_KEY_ID=rzp_test_fake RAZORPAY_KEY_SECRET=fake-secret
+
+The key pair must match --key-id/--key-secret. Implements POST /v1/orders
+and GET /v1/orders/{id}, with injectable latency, 500s and hung requests to
+exercise timeouts and the circuit breaker. POST /v1/fake/orders/{id}/pay
+returns a payment id and a valid signature, as checkout would after the
+customer pays, so /api/payment/verify can be driven without a browser; it
+needs no API key, like the browser side of checkout. With --webhook-url it
+also delivers a signed payment.captured webhook, as Razorpay would.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import random
+import time
+import json
+import uuid
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.responses import JSONResponse
+
+def create_app(key_id: str, key_secret: str, latency_ms: float = 0, jitter_ms: float = 0,
+               error_rate: float = 0, hang_rate: float = 0,
+               webhook_url: str = None, webhook_secret: str = None) -> FastAPI:
+    app = FastAPI(title="Fake Razorpay")
+    orders = {}
+    deliveries = set()
+
+    async def deliver_webhook(order: dict, payment_id: str):
+        body = json.dumps({
+            "entity": "event",
+            "event": "payment.captured",
+            "contains": ["payment"],
+            "payload": {"payment": {"entity": {
+                "id": payment_id, "entity": "payment", "amount": order['amount'], "currency": order['currency'],
+                "status": "captured", "order_id": order['id']
+            }}},
+            "created_at": int(time.time())
+        }).encode()
+        signature = hmac.new(webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+        try:
+            async with httpx.AsyncClient(timeout=10) as client:
+                await client.post(webhook_url, content=body, headers={
+                    "Content-Type": "application/json",
+                    "X-Razorpay-Signature": signature,
+                    "X-Razorpay-Event-Id": f"evt_{uuid.uuid4().hex[:14]}"
+                })
+        except httpx.HTTPError as exc:
+            print(f"webhook delivery for {order['id']} failed: {exc!r}")
+    expected_auth = "Basic " + base64.b64encode(f"{key_id}:{key_secret}".encode()).decode()
+
+    def gateway_error(code: int, description: str):
+        return HTTPException(status_code=code, detail={"code": "BAD_REQUEST_ERROR", "description": description})
+
+    @app.exception_handler(HTTPException)
+    async def razorpay_error_body(request: Request, exc: HTTPException):
+        return JSONResponse({"error": exc.detail}, status_code=exc.status_code)
+
+    @app.middleware("http")
+    async def simulate_gateway(request: Request, call_next):
+        if random.random() < hang_rate:
+            await asyncio.sleep(3600)
+        await asyncio.sleep(max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000)
+        if random.random() < error_rate:
+            return JSONResponse(
+                {"error": {"code": "SERVER_ERROR", "description": "Injected failure"}},
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        if not request.url.path.startswith("/v1/fake/") and request.headers.get("authorization") != expected_auth:
+            return JSONResponse(
+                {"error": {"code": "BAD_REQUEST_ERROR", "description": "Authentication failed"}},
+                status_code=status.HTTP_401_UNAUTHORIZED
+            )
+        return await call_next(request)
+
+    @app.post("/v1/orders")
+    async def create_order(payload: dict):
+        amount = payload.get("amount")
+        if not isinstance(amount, int) or amount < 100:
+            raise gateway_error(status.HTTP_400_BAD_REQUEST, "The amount must be atleast INR 1.00")
+        order = {
+            "id": f"order_{uuid.uuid4().hex[:14]}",
+            "entity": "order",
+            "amount": amount,
+            "amount_paid": 0,
+            "amount_due": amount,
+            "currency": payload.get("currency", "INR"),
+            "receipt": payload.get("receipt"),
+            "status": "created",
+            "attempts": 0,
+            "notes": payload.get("notes", []),
+            "created_at": int(time.time())
+        }
+        orders[order['id']] = order
+        return order
+
+    @app.get("/v1/orders/{order_id}")
+    async def get_order(order_id: str):
+        if order_id not in orders:
+            raise gateway_error(status.HTTP_400_BAD_REQUEST, "The id provided does not exist")
+        return orders[order_id]
+
+    @app.post("/v1/fake/orders/{order_id}/pay")
+    async def pay_order(order_id: str):
+        if order_id not in orders:
+            raise gateway_error(status.HTTP_400_BAD_REQUEST, "The id provided does not exist")
+        order = orders[order_id]
+        order.update(status="paid", amount_paid=order['amount'], amount_due=0, attempts=order['attempts'] + 1)
+        payment_id = f"pay_{uuid.uuid4().hex[:14]}"
+        signature = hmac.new(key_secret.encode(), f"{order_id}|{payment_id}".encode(), hashlib.sha256).hexdigest()
+        if webhook_url:
+            task = asyncio.create_task(deliver_webhook(order, payment_id))
+            deliveries.add(task)
+            task.add_done_callback(deliveries.discard)
+        return {
+            "razorpay_order_id": order_id,
+            "razorpay_payment_id": payment_id,
+            "razorpay_signature": signature
+        }
+
+    return app
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9090)
+    parser.add_argument("--key-id", default="rzp_test_fake")
+    parser.add_argument("--key-secret", default="fake-secret")
+    parser.add_argument("--latency-ms", type=float, default=150.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with a 500")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="Fraction of requests that never answer")
+    parser.add_argument("--webhook-url", help="e.g. http://localhost:8001/api/payment/webhook")
+    parser.add_argument("--webhook-secret", default="fake-webhook-secret")
+    args = parser.parse_args()
+
+    app = create_app(args.key_id, args.key_secret, args.latency_ms, args.jitter_ms, args.error_rate, args.hang_rate,
+                     args.webhook_url, args.webhook_secret)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from auth import get_password_hash, verify_and_update_password
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded thread pool so hashing never blocks the event loop.
+
+    bcrypt releases the GIL while it works, so `max_workers` is also the number
+    of hashes computed in parallel; further calls wait in the pool's queue.
+    """
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.run_seconds_total = 0.0
+
+    def _timed(self, enqueued_at: float, fn, *args):
+        started_at = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+        try:
+            return fn(*args)
+        finally:
+            finished_at = time.perf_counter()
+            waited = started_at - enqueued_at
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+                self.wait_seconds_total += waited
+                self.wait_seconds_max = max(self.wait_seconds_max, waited)
+                self.run_seconds_total += finished_at - started_at
+
+    async def _submit(self, fn, *args):
+        with self._lock:
+            self.queued += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._timed, time.perf_counter(), fn, *args)
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(get_password_hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        return await self._submit(verify_and_update_password, password, hashed_password)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            completed = self.completed
+            return {
+                "max_workers": self.max_workers,
+                "queued": self.queued,
+                "running": self.running,
+                "completed": completed,
+                "avg_wait_ms": self.wait_seconds_total / completed * 1000 if completed else 0.0,
+                "max_wait_ms": self.wait_seconds_max * 1000,
+                "avg_run_ms": self.run_seconds_total / completed * 1000 if completed else 0.0
+            }
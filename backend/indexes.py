@@ -0,0 +1,147 @@
+import logging
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from pagination import NEWEST_FIRST
+
+logger = logging.getLogger(__name__)
+
+# Indexes for every collection server.py queries. Keep in sync with ROUTE_QUERIES below.
+INDEXES = {
+    "users": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "products": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("category", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("brand", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("price", ASCENDING)]),
+    ],
+    "categories": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("type", ASCENDING)]),
+    ],
+    "brands": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("type", ASCENDING)]),
+    ],
+    "carts": [
+        IndexModel([("user_id", ASCENDING)], unique=True),
+    ],
+    "wishlists": [
+        IndexModel([("user_id", ASCENDING)], unique=True),
+    ],
+    "orders": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("payment_status", ASCENDING)]),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("razorpay_order_id", ASCENDING)], unique=True, sparse=True),
+        IndexModel([("payment_status", ASCENDING), ("reconcile_checked_at", ASCENDING), ("created_at", ASCENDING)]),
+        IndexModel([("payment_status", ASCENDING), ("created_at", ASCENDING)]),
+    ],
+    "payment_events": [
+        IndexModel([("processed_at", ASCENDING), ("received_at", ASCENDING)]),
+        # Processed events are kept a week for auditing
+        IndexModel([("processed_at", ASCENDING)], name="processed_at_ttl", expireAfterSeconds=7 * 24 * 3600),
+    ],
+    "rate_limits": [
+        # Only used with RATE_LIMIT_BACKEND=mongo; idle buckets are full again by expires_at
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "reviews": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("product_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)]),
+    ],
+    "blogs": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("created_at", DESCENDING)]),
+    ],
+}
+
+# Representative query shape for each route, used to check that the planner picks an index.
+ROUTE_QUERIES = [
+    ("GET /api/auth/me", "users", {"id": ""}, None),
+    ("POST /api/auth/login", "users", {"email": ""}, None),
+    ("GET /api/products", "products", {}, NEWEST_FIRST),
+    ("GET /api/products?category", "products", {"category": ""}, NEWEST_FIRST),
+    ("GET /api/products?brand", "products", {"brand": ""}, NEWEST_FIRST),
+    ("GET /api/products?min_price", "products", {"price": {"$gte": 0}}, NEWEST_FIRST),
+    ("GET /api/products?search", "products", {"id": {"$in": [""]}}, None),
+    ("GET /api/products/{product_id}", "products", {"id": ""}, None),
+    ("GET /api/categories", "categories", {"type": ""}, None),
+    ("GET /api/brands", "brands", {"type": ""}, None),
+    ("GET /api/cart", "carts", {"user_id": ""}, None),
+    ("GET /api/wishlist", "wishlists", {"user_id": ""}, None),
+    ("GET /api/orders", "orders", {"user_id": ""}, NEWEST_FIRST),
+    ("POST /api/payment/create-order", "orders", {"id": "", "user_id": ""}, None),
+    ("POST /api/payment/verify", "orders", {"$or": [{"id": ""}, {"razorpay_order_id": ""}], "user_id": ""}, None),
+    ("payment event worker", "payment_events", {"processed_at": None}, [("received_at", 1)]),
+    ("payment event worker", "orders", {"razorpay_order_id": {"$in": [""]}, "payment_batch": ""}, None),
+    ("payment reconciler", "orders", {"payment_status": "pending", "created_at": {"$lt": 0}},
+     [("reconcile_checked_at", 1), ("created_at", 1)]),
+    ("order expiry", "orders", {"payment_status": "pending", "created_at": {"$lt": 0},
+                                "razorpay_order_id": {"$exists": False}}, [("created_at", 1)]),
+    ("GET /api/reviews/{product_id}", "reviews", {"product_id": ""}, NEWEST_FIRST),
+    ("GET /api/blogs", "blogs", {}, [("created_at", -1)]),
+    ("GET /api/blogs/{blog_id}", "blogs", {"id": ""}, None),
+    ("GET /api/admin/stats", "stats", {"_id": "dashboard"}, None),
+    ("POST /api/admin/stats/rebuild", "orders", {"payment_status": "success"}, None),
+    ("GET /api/admin/orders", "orders", {}, NEWEST_FIRST),
+    ("PUT /api/admin/orders/{order_id}/status", "orders", {"id": ""}, None),
+]
+
+async def ensure_indexes(db) -> list:
+    """Create every index in INDEXES; returns (collection, index name, error) for those that failed.
+
+    Indexes are created one at a time so one that can't be built, typically a
+    unique index over data that already has duplicates, is logged and skipped
+    instead of stopping startup. The app still works without it, only slower
+    and without that uniqueness guarantee until the duplicates are cleaned up.
+    """
+    failures = []
+    for collection, indexes in INDEXES.items():
+        for index in indexes:
+            try:
+                await db[collection].create_indexes([index])
+            except OperationFailure as e:
+                name = index.document["name"]
+                logger.warning(f"Could not create index {collection}.{name}: {e}")
+                failures.append((collection, name, str(e)))
+    return failures
+
+def plan_stages(plan: dict):
+    yield plan.get("stage")
+    if "inputStage" in plan:
+        yield from plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from plan_stages(child)
+
+async def explain_route_queries(db) -> list:
+    report = []
+    for route, collection, query, sort in ROUTE_QUERIES:
+        find = {"find": collection, "filter": query}
+        if sort:
+            find["sort"] = dict(sort)
+        explain = await db.command({"explain": find, "verbosity": "queryPlanner"})
+        stages = list(plan_stages(explain["queryPlanner"]["winningPlan"]))
+        report.append({
+            "route": route,
+            "collection": collection,
+            "stages": stages,
+            "collection_scan": "COLLSCAN" in stages
+        })
+    return report
+
+async def index_stats(db) -> dict:
+    stats = {}
+    for collection in INDEXES:
+        entries = await db[collection].aggregate([{"$indexStats": {}}]).to_list(None)
+        stats[collection] = [
+            {"name": e["name"], "key": e["key"], "ops": e["accesses"]["ops"], "since": e["accesses"]["since"]}
+            for e in entries
+        ]
+    return stats
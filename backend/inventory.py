@@ -0,0 +1,64 @@
+"""Stock reservation for order placement.
+
+Stock is taken with one unordered bulk_write of conditional decrements
+(`stock >= quantity`), so it can never go negative and works on a standalone
+mongod, where multi-document transactions are unavailable. Each decrement
+also tags the product with the order id in `stock_holds`; if only some lines
+could be reserved, the tag tells us which ones to put back.
+"""
+from pymongo import UpdateOne
+
+async def reserve_stock(db, order_id: str, quantities: dict) -> list:
+    """Decrement stock for every product in `quantities` ({product_id: qty}), all or nothing.
+
+    Returns the product ids that could not be reserved; when that list is not
+    empty nothing has been taken.
+    """
+    result = await db.products.bulk_write([
+        UpdateOne(
+            {"id": product_id, "stock": {"$gte": quantity}},
+            {"$inc": {"stock": -quantity}, "$push": {"stock_holds": order_id}}
+        )
+        for product_id, quantity in quantities.items()
+    ], ordered=False)
+    if result.modified_count == len(quantities):
+        return []
+
+    held = await db.products.find(
+        {"id": {"$in": list(quantities)}, "stock_holds": order_id}, {"_id": 0, "id": 1}
+    ).to_list(None)
+    held = {product['id'] for product in held}
+    await release_stock(db, order_id, {product_id: quantities[product_id] for product_id in held})
+    return [product_id for product_id in quantities if product_id not in held]
+
+async def release_stock(db, order_id: str, quantities: dict):
+    """Give back stock taken by `reserve_stock` for this order."""
+    if not quantities:
+        return
+    await db.products.bulk_write([
+        UpdateOne(
+            {"id": product_id, "stock_holds": order_id},
+            {"$inc": {"stock": quantity}, "$pull": {"stock_holds": order_id}}
+        )
+        for product_id, quantity in quantities.items()
+    ], ordered=False)
+
+async def commit_stock(db, order_id: str, product_ids: list):
+    """Drop the order's hold tags once the order is stored; the decrements stay."""
+    await db.products.update_many(
+        {"id": {"$in": product_ids}, "stock_holds": order_id},
+        {"$pull": {"stock_holds": order_id}}
+    )
+
+async def restock(db, quantities: dict):
+    """Put back the stock of an order that will never be fulfilled.
+
+    The hold tags are gone by then, so this is unconditional: callers must make
+    sure it runs once per order.
+    """
+    if not quantities:
+        return
+    await db.products.bulk_write([
+        UpdateOne({"id": product_id}, {"$inc": {"stock": quantity}})
+        for product_id, quantity in quantities.items()
+    ], ordered=False)
@@ -0,0 +1,288 @@
+"""Request and MongoDB command metrics in the Prometheus text format.
+
+MetricsMiddleware times every HTTP request by route template and keeps an
+in-flight count. MongoCommandMetrics is a pymongo CommandListener: it times
+each command by collection and operation and labels it with the route of
+the request that issued it (Motor runs commands in executor threads with a
+copy of the caller's context, so a ContextVar set by the middleware reaches
+the listener). Work outside a request is labelled "background".
+MongoPoolMetrics is a ConnectionPoolListener tracking open and checked-out
+connections, connection churn and how long requests wait for a connection.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Optional
+
+from pymongo import monitoring
+
+# Upper bounds in seconds, as Prometheus' default buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+MONGO_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# The ASGI scope of the request being handled; the router adds the matched route to it
+_request_scope: ContextVar[Optional[dict]] = ContextVar("request_scope", default=None)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._series = {}
+
+    def observe(self, labels: tuple, seconds: float):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += seconds
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: ([*counts], total) for labels, (counts, total) in self._series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: tuple, kind: str = "counter"):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.kind = kind
+        self._lock = threading.Lock()
+        self._values = defaultdict(float)
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] += amount
+
+    def dec(self, labels: tuple = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+    def value(self, labels: tuple = ()) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def label_sets(self) -> list:
+        with self._lock:
+            return sorted(self._values)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+def Gauge(name: str, help_text: str, label_names: tuple) -> Counter:
+    return Counter(name, help_text, label_names, kind="gauge")
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status")
+))
+http_requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests being handled, by method.", ("method",)
+))
+mongo_command_duration = registry.register(Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency by collection, operation and originating route.",
+    ("collection", "command", "route"), MONGO_BUCKETS
+))
+mongo_command_failures = registry.register(Counter(
+    "mongodb_command_failures_total", "Failed MongoDB commands by collection, operation and originating route.",
+    ("collection", "command", "route")
+))
+requests_rejected = registry.register(Counter(
+    "http_requests_rejected_total", "Requests refused by admission control, by reason and rate-limit budget.",
+    ("reason", "budget")
+))
+admission_in_flight = registry.register(Gauge(
+    "http_admission_in_flight", "Requests holding a concurrency slot.", ()
+))
+admission_waiting = registry.register(Gauge(
+    "http_admission_waiting", "Requests queued for a concurrency slot.", ()
+))
+pool_connections = registry.register(Gauge(
+    "mongodb_pool_connections", "Open MongoDB connections by server.", ("address",)
+))
+pool_checked_out = registry.register(Gauge(
+    "mongodb_pool_connections_checked_out", "MongoDB connections in use by server.", ("address",)
+))
+pool_connections_created = registry.register(Counter(
+    "mongodb_pool_connections_created_total", "MongoDB connections opened by server.", ("address",)
+))
+pool_checkout_wait = registry.register(Histogram(
+    "mongodb_pool_checkout_wait_seconds", "Time spent waiting for a pooled MongoDB connection.", ("address",),
+    MONGO_BUCKETS
+))
+pool_checkout_failures = registry.register(Counter(
+    "mongodb_pool_checkout_failures_total", "Failed MongoDB connection checkouts by server and reason.",
+    ("address", "reason")
+))
+pool_cleared = registry.register(Counter(
+    "mongodb_pool_cleared_total", "Times a MongoDB connection pool was cleared after a network error.", ("address",)
+))
+
+def _route_path(scope: dict) -> str:
+    # Unmatched paths are lumped together so scanners can't blow up the label set
+    return getattr(scope.get("route"), "path", None) or "unmatched"
+
+def current_route() -> str:
+    """The route handling the current request, as "METHOD /path/{param}"."""
+    scope = _request_scope.get()
+    if scope is None:
+        return "background"
+    return f"{scope.get('method', '')} {_route_path(scope)}"
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        method = scope.get("method", "")
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        token = _request_scope.set(scope)
+        http_requests_in_flight.inc((method,))
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.dec((method,))
+            _request_scope.reset(token)
+            http_request_duration.observe((method, _route_path(scope), str(status_code)), time.perf_counter() - start)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def started(self, event):
+        value = event.command.get(event.command_name)
+        collection = value if isinstance(value, str) else event.command.get("collection", "")
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (collection, current_route())
+
+    def _finish(self, event) -> Optional[tuple]:
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return None
+        collection, route = pending
+        labels = (collection, event.command_name, route)
+        mongo_command_duration.observe(labels, event.duration_micros / 1e6)
+        return labels
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        labels = self._finish(event)
+        if labels:
+            mongo_command_failures.inc(labels)
+
+def _address(address) -> str:
+    host, port = address
+    return f"{host}:{port}"
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    def connection_created(self, event):
+        labels = (_address(event.address),)
+        pool_connections.inc(labels)
+        pool_connections_created.inc(labels)
+
+    def connection_closed(self, event):
+        pool_connections.dec((_address(event.address),))
+
+    def connection_checked_out(self, event):
+        labels = (_address(event.address),)
+        pool_checked_out.inc(labels)
+        if event.duration is not None:
+            pool_checkout_wait.observe(labels, event.duration)
+
+    def connection_checked_in(self, event):
+        pool_checked_out.dec((_address(event.address),))
+
+    def connection_check_out_failed(self, event):
+        pool_checkout_failures.inc((_address(event.address), str(event.reason)))
+
+    def pool_cleared(self, event):
+        pool_cleared.inc((_address(event.address),))
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def snapshot(self) -> dict:
+        return {
+            address: {
+                "open": int(pool_connections.value((address,))),
+                "checked_out": int(pool_checked_out.value((address,))),
+                "created": int(pool_connections_created.value((address,)))
+            }
+            for (address,) in pool_connections.label_sets()
+        }
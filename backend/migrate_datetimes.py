@@ -0,0 +1,85 @@
+"""Convert ISO-string timestamps to native BSON datetimes.
+
+    python migrate_datetimes.py [--batch-size 1000] [--dry-run]
+
+Each batch only selects documents whose fields are still strings and each
+write is conditional on the string being unchanged, so the migration can be
+stopped and re-run at any point. Strings without a UTC offset were written
+with the server's local time and are converted from it.
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pymongo import UpdateOne
+
+DATETIME_FIELDS = {
+    "users": ["created_at"],
+    "products": ["created_at", "ratings_reconciled_at"],
+    "carts": ["updated_at"],
+    "wishlists": ["updated_at"],
+    "orders": ["created_at"],
+    "reviews": ["created_at"],
+    "blogs": ["created_at"],
+}
+
+def parse_timestamp(value: str) -> datetime:
+    # astimezone() treats naive values as local time
+    return datetime.fromisoformat(value).astimezone(timezone.utc)
+
+async def migrate_collection(collection, fields: list, batch_size: int, dry_run: bool) -> int:
+    string_query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+    if dry_run:
+        return await collection.count_documents(string_query)
+
+    migrated = 0
+    last_id = None
+    while True:
+        query = string_query if last_id is None else {"$and": [string_query, {"_id": {"$gt": last_id}}]}
+        docs = await collection.find(query, {field: 1 for field in fields}) \
+            .sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            return migrated
+
+        requests = []
+        for doc in docs:
+            for field in fields:
+                value = doc.get(field)
+                if not isinstance(value, str):
+                    continue
+                try:
+                    parsed = parse_timestamp(value)
+                except ValueError:
+                    print(f"  skipping {collection.name} {doc['_id']}: unparseable {field}={value!r}")
+                    continue
+                requests.append(UpdateOne({"_id": doc['_id'], field: value}, {"$set": {field: parsed}}))
+
+        if requests:
+            result = await collection.bulk_write(requests, ordered=False)
+            migrated += result.modified_count
+        last_id = docs[-1]['_id']
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Only count documents still holding strings")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+
+    print("Migrating timestamps to BSON datetimes..." if not args.dry_run else "Counting string timestamps...")
+    for name, fields in DATETIME_FIELDS.items():
+        count = await migrate_collection(db[name], fields, args.batch_size, args.dry_run)
+        print(f"{name}: {count} {'documents pending' if args.dry_run else 'fields converted'}")
+    print("Done!")
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
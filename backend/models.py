@@ -47,6 +47,28 @@ class ProductCreate(BaseModel):
     image: str
     stock: int = 0
 
+class ProductBatchRequest(BaseModel):
+    ids: List[str]
+
+class ProductBatch(BaseModel):
+    products: List[Product]  # in requested order
+    missing: List[str] = []
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class PriceRangeCount(BaseModel):
+    min: float
+    max: Optional[float] = None  # open-ended top range
+    count: int
+
+class ProductFacets(BaseModel):
+    total: int
+    categories: List[FacetCount]
+    brands: List[FacetCount]
+    price_ranges: List[PriceRangeCount]
+
 class Category(BaseModel):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -95,14 +117,15 @@ class Order(BaseModel):
     items: List[OrderItem]
     total_amount: float
     payment_id: Optional[str] = None
-    payment_status: str = "pending"  # pending, success, failed
+    payment_status: str = "pending"  # pending, success, failed (expired unpaid), refund_due (paid after expiry, out of stock)
     order_status: str = "processing"  # processing, shipped, delivered, cancelled
     shipping_address: dict
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class OrderCreate(BaseModel):
-    items: List[OrderItem]
-    total_amount: float
+    # Only product ids and quantities are used; names, prices and the total are set server-side
+    items: List[CartItem]
+    total_amount: Optional[float] = None
     shipping_address: dict
 
 class Review(BaseModel):
@@ -0,0 +1,41 @@
+"""Motor client settings, connection warm-up and health checks.
+
+The client is created in server.py's lifespan handler rather than at import,
+so the pool is sized from the environment and its first connections are
+opened (TCP, TLS and auth handshakes included) before the process reports
+ready.
+"""
+import asyncio
+import os
+import time
+
+def pool_options() -> dict:
+    """Pool settings for AsyncIOMotorClient, from the MONGO_* environment variables."""
+    options = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "100")),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "10")),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")),
+        "maxConnecting": int(os.getenv("MONGO_MAX_CONNECTING", "2")),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "30000")),
+    }
+    # Unset means requests wait for a free connection as long as it takes
+    if os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS"):
+        options["waitQueueTimeoutMS"] = int(os.environ["MONGO_WAIT_QUEUE_TIMEOUT_MS"])
+    return options
+
+async def warm_up(client, connections: int) -> float:
+    """Open up to `connections` pooled connections with concurrent pings.
+
+    minPoolSize alone fills the pool from a background thread some time after
+    startup; this makes sure the first requests don't pay for the handshakes.
+    Returns the seconds taken.
+    """
+    start = time.perf_counter()
+    await asyncio.gather(*(client.admin.command("ping") for _ in range(max(connections, 1))))
+    return time.perf_counter() - start
+
+async def ping(client, timeout: float) -> float:
+    """Round trip to the server in milliseconds; raises on failure or timeout."""
+    start = time.perf_counter()
+    await asyncio.wait_for(client.admin.command("ping"), timeout)
+    return (time.perf_counter() - start) * 1000
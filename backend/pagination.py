@@ -0,0 +1,87 @@
+import base64
+import json
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+MAX_PAGE_SIZE = 1000
+
+# Sort order shared by every paginated list; `id` breaks ties between equal timestamps
+NEWEST_FIRST = [("created_at", -1), ("id", -1)]
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    return value
+
+def _decode_value(value):
+    # Only what _encode_value produces; anything else would reach the query as an operator
+    if isinstance(value, dict) and value.keys() == {"$date"} and isinstance(value["$date"], str):
+        return datetime.fromisoformat(value["$date"])
+    if value is None or (isinstance(value, (str, int, float)) and not isinstance(value, bool)):
+        return value
+    raise ValueError(f"Unexpected cursor value {value!r}")
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if isinstance(values, list) and len(values) == size:
+            return [_decode_value(v) for v in values]
+    except ValueError:
+        pass
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def _after(field: str, direction: int, value) -> Optional[dict]:
+    # Documents missing `field` sort as null: after every value when descending, before when ascending
+    if direction < 0:
+        return None if value is None else {"$or": [{field: {"$lt": value}}, {field: None}]}
+    return {field: {"$ne": None}} if value is None else {field: {"$gt": value}}
+
+def keyset_query(query: dict, sort: list, cursor: Optional[str]) -> dict:
+    """Restrict `query` to documents that sort after the cursor position."""
+    if not cursor:
+        return query
+    values = decode_cursor(cursor, len(sort))
+    # (k1 after v1) OR (k1 == v1 AND k2 after v2) OR ...
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        after = _after(field, direction, values[i])
+        if after is None:
+            continue
+        equal = {f: values[j] for j, (f, _) in enumerate(sort[:i])}
+        clauses.append({"$and": [equal, after]} if equal else after)
+    # A cursor at the very end (nulls all the way down) has nothing after it
+    keyset = {"$or": clauses} if clauses else {"_id": {"$in": []}}
+    return {"$and": [query, keyset]} if query else keyset
+
+async def fetch_page(
+    collection,
+    query: dict,
+    limit: int,
+    cursor: Optional[str] = None,
+    sort: list = NEWEST_FIRST,
+    projection: Optional[dict] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """Fetch one page in index order. Returns the documents and the cursor for the next page."""
+    projection = projection or {"_id": 0}
+    docs = await collection.find(keyset_query(query, sort, cursor), projection) \
+        .sort(sort).limit(limit + 1).to_list(limit + 1)
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    return docs, encode_cursor([docs[-1].get(field) for field, _ in sort])
+
+def offset_from_cursor(cursor: Optional[str]) -> int:
+    # Offset cursors page through results ranked in memory, e.g. product search
+    if not cursor:
+        return 0
+    offset = decode_cursor(cursor, 1)[0]
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return offset
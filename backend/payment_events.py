@@ -0,0 +1,386 @@
+"""Razorpay webhook ingestion.
+
+The webhook route only verifies the signature and inserts the event into
+`payment_events`, keyed by Razorpay's event id so redeliveries are no-ops.
+PaymentEventWorker drains that collection in batches: events for the same
+gateway order are coalesced and the batch is applied to `orders` with one
+bulk_write. PaymentReconciler periodically asks the gateway about orders
+that have been pending too long and feeds what it learns through the same
+queue.
+
+Every process runs its own worker; updates are conditional on the current
+payment status, so overlapping workers can't double-apply an event.
+"""
+import asyncio
+import hashlib
+import hmac
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from inventory import commit_stock, release_stock, reserve_stock, restock
+from payments import GatewayUnavailable, PaymentGatewayError
+from stats import increment_stats
+
+logger = logging.getLogger(__name__)
+
+# Gateway events we act on, and the payment status each one means
+EVENT_STATUSES = {
+    "payment.captured": "success",
+    "order.paid": "success",
+    "payment.failed": "failed",
+}
+
+def verify_webhook_signature(body: bytes, signature: str, secret: str) -> bool:
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or "")
+
+def parse_webhook(body: bytes, event_id: Optional[str]) -> Optional[dict]:
+    """Turn a webhook body into a queue entry, or None for events we ignore."""
+    event = json.loads(body)
+    payment_status = EVENT_STATUSES.get(event.get("event"))
+    if not payment_status:
+        return None
+    payment = event.get("payload", {}).get("payment", {}).get("entity", {})
+    razorpay_order_id = payment.get("order_id") or event.get("payload", {}).get("order", {}).get("entity", {}).get("id")
+    if not razorpay_order_id:
+        return None
+    return {
+        # Razorpay resends an event with the same id; fall back to the body hash
+        "_id": event_id or hashlib.sha256(body).hexdigest(),
+        "event": event["event"],
+        "razorpay_order_id": razorpay_order_id,
+        "payment_id": payment.get("id"),
+        "payment_status": payment_status,
+        "source": "webhook"
+    }
+
+async def enqueue_event(db, entry: dict) -> bool:
+    """Store an event for the worker. Returns False if it was already queued."""
+    try:
+        await db.payment_events.insert_one({**entry, "received_at": datetime.now(timezone.utc), "processed_at": None})
+    except DuplicateKeyError:
+        return False
+    return True
+
+def order_quantities(order: dict) -> dict:
+    quantities = {}
+    for item in order.get('items', []):
+        quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+    return quantities
+
+async def settle_expired_order(db, order_id: str, payment_id: Optional[str]) -> Optional[str]:
+    """Accept a payment that arrived after the order expired and its stock went back.
+
+    The stock is taken again if it is still there and the order becomes paid;
+    otherwise the order is marked `refund_due` to be refunded by hand. Returns the
+    new payment status, or None if the order isn't expired (or someone else
+    settled it first).
+    """
+    order = await db.orders.find_one({"id": order_id, "payment_status": "failed"},
+                                     {"_id": 0, "items": 1, "total_amount": 1})
+    if not order:
+        return None
+    quantities = order_quantities(order)
+    update = {"payment_id": payment_id} if payment_id else {}
+    if await reserve_stock(db, order_id, quantities):
+        result = await db.orders.update_one({"id": order_id, "payment_status": "failed"},
+                                            {"$set": {**update, "payment_status": "refund_due"}})
+        if not result.modified_count:
+            return None
+        logger.warning(f"Order {order_id} was paid after it expired and its stock is gone; "
+                       f"refund payment {payment_id or 'on its gateway order'}")
+        return "refund_due"
+    result = await db.orders.update_one({"id": order_id, "payment_status": "failed"},
+                                        {"$set": {**update, "payment_status": "success"}})
+    if not result.modified_count:
+        await release_stock(db, order_id, quantities)
+        return None
+    await commit_stock(db, order_id, list(quantities))
+    await increment_stats(db, total_revenue=order.get('total_amount', 0))
+    return "success"
+
+def coalesce(events: list) -> dict:
+    # One outcome per gateway order: any success wins over failed attempts
+    outcomes = {}
+    for event in events:
+        current = outcomes.get(event['razorpay_order_id'])
+        if current is None or (current['payment_status'] != "success" and event['payment_status'] == "success"):
+            outcomes[event['razorpay_order_id']] = event
+    return outcomes
+
+async def apply_events(db, events: list) -> tuple:
+    """Apply a batch of queued events to orders and mark them processed.
+
+    A successful payment marks the order paid, or settles it through
+    settle_expired_order if it had already expired. A failed attempt is only
+    recorded on the order, which stays pending: the customer may still retry it.
+
+    Returns (orders updated, events that matched no order). Unmatched events are
+    kept with `unmatched: True` and logged rather than applied.
+    """
+    outcomes = coalesce(events)
+    linked = set(await db.orders.distinct("razorpay_order_id", {"razorpay_order_id": {"$in": list(outcomes)}}))
+    unmatched = [event['_id'] for event in events if event['razorpay_order_id'] not in linked]
+    if unmatched:
+        logger.warning(f"{len(unmatched)} payment events match no order: "
+                       f"{sorted({event['razorpay_order_id'] for event in events} - linked)}")
+    batch_id = str(uuid.uuid4())
+    requests = []
+    for razorpay_order_id, event in outcomes.items():
+        if razorpay_order_id not in linked:
+            continue
+        if event['payment_status'] == "success":
+            # Tag the orders this batch moves to success so their revenue is counted exactly once
+            update = {"payment_status": "success", "payment_batch": batch_id}
+            query = {"razorpay_order_id": razorpay_order_id, "payment_status": "pending"}
+        else:
+            # Razorpay lets the customer retry a failed attempt, so the order stays pending
+            # (holding its stock) until it is paid or the reconciler expires it
+            update = {"last_failed_payment_id": event.get('payment_id'), "last_failed_at": event.get('received_at')}
+            query = {"razorpay_order_id": razorpay_order_id, "payment_status": "pending"}
+            requests.append(UpdateOne(query, {"$set": update}))
+            continue
+        # Reconciler events don't know the payment id
+        if event.get('payment_id'):
+            update['payment_id'] = event['payment_id']
+        requests.append(UpdateOne(query, {"$set": update}))
+
+    updated = 0
+    if requests:
+        result = await db.orders.bulk_write(requests, ordered=False)
+        updated = result.modified_count
+        revenue = await db.orders.aggregate([
+            {"$match": {"razorpay_order_id": {"$in": list(outcomes)}, "payment_batch": batch_id}},
+            {"$group": {"_id": None, "total": {"$sum": "$total_amount"}}}
+        ]).to_list(1)
+        if revenue and revenue[0]['total']:
+            await increment_stats(db, total_revenue=revenue[0]['total'])
+
+    # Paid after expiry: the stock has to be taken again before the order counts as paid
+    paid = [razorpay_order_id for razorpay_order_id, event in outcomes.items()
+            if razorpay_order_id in linked and event['payment_status'] == "success"]
+    if paid:
+        async for order in db.orders.find({"razorpay_order_id": {"$in": paid}, "payment_status": "failed"},
+                                          {"_id": 0, "id": 1, "razorpay_order_id": 1}):
+            payment_id = outcomes[order['razorpay_order_id']].get('payment_id')
+            updated += await settle_expired_order(db, order['id'], payment_id) is not None
+
+    await db.payment_events.update_many(
+        {"_id": {"$in": [event['_id'] for event in events]}},
+        {"$set": {"processed_at": datetime.now(timezone.utc)}}
+    )
+    if unmatched:
+        # Kept for the same week as processed events, for matching up by hand
+        await db.payment_events.update_many({"_id": {"$in": unmatched}}, {"$set": {"unmatched": True}})
+    return updated, len(unmatched)
+
+class PaymentEventWorker:
+    """Background task that drains `payment_events` in batches."""
+
+    def __init__(self, db, batch_size: int = 500, interval: float = 1.0):
+        self.db = db
+        self.batch_size = batch_size
+        self.interval = interval
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.events = 0
+        self.orders_updated = 0
+        self.unmatched = 0
+
+    def notify(self):
+        # Called by the webhook route so new events are picked up without waiting for the poll
+        self._wake.set()
+
+    async def drain(self) -> int:
+        drained = 0
+        while True:
+            events = await self.db.payment_events.find({"processed_at": None}) \
+                .sort("received_at", 1).limit(self.batch_size).to_list(self.batch_size)
+            if not events:
+                return drained
+            updated, unmatched = await apply_events(self.db, events)
+            self.orders_updated += updated
+            self.unmatched += unmatched
+            self.batches += 1
+            self.events += len(events)
+            drained += len(events)
+
+    async def _run(self):
+        while True:
+            try:
+                await self.drain()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Payment event batch failed; retrying")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "events": self.events, "orders_updated": self.orders_updated,
+                "unmatched": self.unmatched}
+
+class PaymentReconciler:
+    """Asks the gateway about orders left pending, for payments whose webhook and
+    browser callback both never arrived. Orders still unpaid after `expire_after`
+    are marked failed and their stock is put back; `on_restock` is awaited with
+    the returned product ids, for callers that cache products.
+
+    Orders never linked to a gateway order (the customer didn't get as far as
+    paying) expire by age alone. Without a gateway (`gateway=None`, no Razorpay
+    keys) that goes for every pending order, since none can have been paid.
+
+    A gateway error for one order (say, an id the gateway no longer knows) is
+    logged and the sweep moves on; only an unavailable gateway ends it early.
+
+    Each sweep stamps the orders it checked with `reconcile_checked_at` and takes
+    the least recently checked ones first, so a backlog larger than `batch_size`
+    is worked through in rotation instead of rechecking the oldest batch forever."""
+
+    def __init__(self, db, gateway, worker: PaymentEventWorker, interval: float = 300.0,
+                 stale_after: float = 900.0, expire_after: float = 86400.0, batch_size: int = 100,
+                 on_restock=None):
+        self.db = db
+        self.gateway = gateway
+        self.worker = worker
+        self.interval = interval
+        self.stale_after = stale_after
+        self.expire_after = expire_after
+        self.batch_size = batch_size
+        self.on_restock = on_restock
+        self._task: Optional[asyncio.Task] = None
+        self.sweeps = 0
+        self.checked = 0
+        self.enqueued = 0
+        self.expired = 0
+        self.gateway_errors = 0
+
+    async def expire(self, order_id: str, unlinked: bool = False) -> bool:
+        # Conditional on still being pending, so the stock is returned exactly once.
+        # `unlinked` also requires that no gateway order was created for it meanwhile.
+        query = {"id": order_id, "payment_status": "pending"}
+        if unlinked:
+            query["razorpay_order_id"] = {"$exists": False}
+        order = await self.db.orders.find_one_and_update(
+            query,
+            {"$set": {"payment_status": "failed"}},
+            projection={"_id": 0, "items": 1}
+        )
+        if not order:
+            return False
+        quantities = order_quantities(order)
+        await restock(self.db, quantities)
+        if self.on_restock and quantities:
+            await self.on_restock(list(quantities))
+        return True
+
+    async def expire_unlinked(self, now: datetime) -> int:
+        query = {"payment_status": "pending", "created_at": {"$lt": now - timedelta(seconds=self.expire_after)}}
+        if self.gateway:
+            query["razorpay_order_id"] = {"$exists": False}
+        orders = await self.db.orders.find(query, {"_id": 0, "id": 1}) \
+            .sort("created_at", 1).limit(self.batch_size).to_list(self.batch_size)
+        expired = 0
+        for order in orders:
+            expired += await self.expire(order['id'], unlinked=self.gateway is not None)
+        return expired
+
+    async def sweep(self) -> int:
+        now = datetime.now(timezone.utc)
+        self.expired += await self.expire_unlinked(now)
+        if not self.gateway:
+            self.sweeps += 1
+            return 0
+        orders = await self.db.orders.find(
+            {
+                "payment_status": "pending",
+                "created_at": {"$lt": now - timedelta(seconds=self.stale_after)},
+                "razorpay_order_id": {"$exists": True}
+            },
+            {"_id": 0, "id": 1, "razorpay_order_id": 1, "created_at": 1}
+        ).sort([("reconcile_checked_at", 1), ("created_at", 1)]).limit(self.batch_size).to_list(self.batch_size)
+
+        enqueued = 0
+        checked = []
+        for order in orders:
+            try:
+                gateway_order = await self.gateway.fetch_order(order['razorpay_order_id'])
+            except GatewayUnavailable as e:
+                logger.warning(f"Payment gateway unavailable; reconciliation sweep stopped early: {e}")
+                break
+            except PaymentGatewayError as e:
+                logger.warning(f"Gateway lookup failed for {order['razorpay_order_id']} (order {order['id']}): {e}")
+                self.gateway_errors += 1
+                gateway_order = {}
+            checked.append(order['id'])
+            if gateway_order.get('status') == "paid":
+                entry = {
+                    "_id": f"reconcile:{order['razorpay_order_id']}:success",
+                    "event": "reconciler",
+                    "razorpay_order_id": order['razorpay_order_id'],
+                    "payment_id": None,
+                    "payment_status": "success",
+                    "source": "reconciler"
+                }
+                enqueued += await enqueue_event(self.db, entry)
+            elif order['created_at'] < now - timedelta(seconds=self.expire_after):
+                self.expired += await self.expire(order['id'])
+
+        if checked:
+            # Never-checked orders sort first (missing sorts before any date), then the stalest
+            await self.db.orders.update_many(
+                {"id": {"$in": checked}},
+                {"$set": {"reconcile_checked_at": now}}
+            )
+        self.sweeps += 1
+        self.checked += len(checked)
+        self.enqueued += enqueued
+        if enqueued:
+            self.worker.notify()
+        return enqueued
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Payment reconciliation sweep failed")
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        return {"sweeps": self.sweeps, "checked": self.checked, "enqueued": self.enqueued,
+                "expired": self.expired, "gateway_errors": self.gateway_errors}
@@ -0,0 +1,267 @@
+"""Bulk product import from CSV or NDJSON.
+
+    python product_import.py products.csv [--format csv|ndjson] [--batch-size 1000] [--dry-run]
+
+Rows are validated with ProductCreate and upserted in unordered bulk_write
+batches. A row with an `id` updates that product (or creates it with that
+id); a row without one creates a new product. Bad rows are reported with
+their row number and never stop the import. The admin route
+POST /api/admin/products/import runs the same code on the request stream.
+
+Imports through the API update the running server's search index and
+caches. After a CLI import, servers find the new products in search at
+their next index rebuild (SEARCH_INDEX_REFRESH) and serve them from their
+caches once the cached entries expire.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from models import ProductCreate
+from stats import increment_stats
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+MAX_RECORD_LINES = 100
+MAX_RECORD_CHARS = 1 << 16
+
+async def _lines(chunks):
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig", errors="replace").rstrip("\r")
+    if pending:
+        yield pending.decode("utf-8-sig", errors="replace").rstrip("\r")
+
+async def ndjson_rows(chunks):
+    """Yield (row_number, row or error message) for each non-blank line."""
+    row_number = 0
+    async for line in _lines(chunks):
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield row_number, f"Invalid JSON: {exc}"
+            continue
+        yield row_number, row if isinstance(row, dict) else "Expected a JSON object"
+
+def _scan_quotes(text: str, in_quotes: bool, field_start: bool):
+    # Carry the quote state of a CSV record across `text`, returning the new
+    # (in_quotes, field_start). A quote only opens a field at its start;
+    # elsewhere in an unquoted field (6.5" display) it is literal.
+    i = 0
+    while True:
+        j = text.find('"', i)
+        if in_quotes:
+            if j < 0:
+                return True, False
+            if text[j + 1:j + 2] == '"':
+                i = j + 2
+                continue
+            in_quotes, field_start = False, False
+        else:
+            if j < 0:
+                return False, (text[-1] in ",\n") if len(text) > i else field_start
+            in_quotes = text[j - 1] in ",\n" if j > i else field_start
+            field_start = False
+        i = j + 1
+
+async def csv_rows(chunks):
+    """Yield (row_number, row or error message) for each CSV record after the header.
+
+    Quoted fields may span lines; a record is complete once no quoted field is open.
+    A record still open after MAX_RECORD_LINES lines or MAX_RECORD_CHARS characters
+    (usually a stray quote) is reported as unterminated and parsing resumes on the
+    line after it started. Empty cells are treated as missing.
+    """
+    header = None
+    row_number = 0
+    record, length, in_quotes, field_start = [], 0, False, True
+    replay = []
+    lines = _lines(chunks)
+
+    async def next_line():
+        if replay:
+            return replay.pop()
+        return await anext(lines, None)
+
+    while True:
+        line = await next_line()
+        if line is None and not record:
+            break
+        if line is not None:
+            in_quotes, field_start = _scan_quotes(f"\n{line}" if record else line, in_quotes, field_start)
+            record.append(line)
+            length += len(line) + 1
+            if in_quotes and len(record) < MAX_RECORD_LINES and length <= MAX_RECORD_CHARS:
+                continue
+        if in_quotes:
+            # Give up on this record and re-read the lines after its first one
+            row_number += 1
+            yield row_number, "Unterminated quoted field"
+            replay.extend(reversed(record[1:]))
+            record, length, in_quotes, field_start = [], 0, False, True
+            continue
+        values = next(csv.reader(io.StringIO("\n".join(record))), [])
+        record, length, in_quotes, field_start = [], 0, False, True
+        if not any(value.strip() for value in values):
+            continue
+        if header is None:
+            header = [value.strip() for value in values]
+            continue
+        row_number += 1
+        if len(values) > len(header):
+            yield row_number, f"Expected {len(header)} columns, got {len(values)}"
+            continue
+        yield row_number, {name: value for name, value in zip(header, values) if value != ""}
+
+def _upsert(row: dict, now: datetime):
+    product = ProductCreate.model_validate(row)
+    product_id = str(row.get("id") or uuid.uuid4())
+    # Columns left out of a row keep their current value; defaults only apply to new products
+    fields = product.model_dump(exclude_unset=True)
+    defaults = {name: value for name, value in product.model_dump().items() if name not in fields}
+    return product_id, fields, UpdateOne(
+        {"id": product_id},
+        {
+            "$set": fields,
+            "$setOnInsert": {"id": product_id, "rating": 0.0, "reviews_count": 0, "created_at": now, **defaults}
+        },
+        upsert=True
+    )
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.errors = []
+        self.started_at = time.perf_counter()
+        self.seconds = 0.0
+
+    def error(self, row_number: int, message, product_id=None):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "id": product_id, "errors": message})
+
+    def summary(self) -> dict:
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "failed": self.failed,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(self.rows / self.seconds, 1) if self.seconds else 0.0
+        }
+
+    def as_dict(self) -> dict:
+        return {**self.summary(), "errors": self.errors, "errors_truncated": self.failed > len(self.errors)}
+
+async def import_products(db, rows, batch_size: int = IMPORT_BATCH_SIZE, dry_run: bool = False,
+                          on_batch=None) -> ImportReport:
+    """Validate and upsert `rows` (from ndjson_rows/csv_rows).
+
+    `on_batch` is awaited with the list of written products ({"id": ..., **fields})
+    after each batch, for callers that keep derived state such as caches.
+    """
+    report = ImportReport()
+    batch = []
+
+    async def flush():
+        requests = [request for _, _, _, request in batch]
+        failed = set()
+        try:
+            result = await db.products.bulk_write(requests, ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as exc:
+            details = exc.details
+            for error in details.get("writeErrors", []):
+                row_number, product_id, _, _ = batch[error["index"]]
+                failed.add(error["index"])
+                report.error(row_number, error.get("errmsg", "Write failed"), product_id)
+        inserted = details.get("nUpserted", 0)
+        report.inserted += inserted
+        report.updated += details.get("nModified", 0)
+        report.unchanged += details.get("nMatched", 0) - details.get("nModified", 0)
+        if inserted:
+            await increment_stats(db, total_products=inserted)
+        if on_batch:
+            await on_batch([{"id": product_id, **fields}
+                            for i, (_, product_id, fields, _) in enumerate(batch) if i not in failed])
+        batch.clear()
+
+    now = datetime.now(timezone.utc)
+    async for row_number, row in rows:
+        report.rows += 1
+        if isinstance(row, str):
+            report.error(row_number, row)
+            continue
+        try:
+            product_id, fields, request = _upsert(row, now)
+        except ValidationError as exc:
+            report.error(row_number, [
+                {"field": ".".join(str(part) for part in error["loc"]), "message": error["msg"]}
+                for error in exc.errors()
+            ], row.get("id"))
+            continue
+        if dry_run:
+            continue
+        batch.append((row_number, product_id, fields, request))
+        if len(batch) >= batch_size:
+            await flush()
+
+    if batch:
+        await flush()
+    report.seconds = time.perf_counter() - report.started_at
+    return report
+
+async def _file_chunks(path: Path, chunk_size: int = 1 << 16):
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            yield chunk
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true", help="Validate rows without writing")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True)
+    db = client[os.environ['DB_NAME']]
+
+    file_format = args.format or ("csv" if args.path.suffix.lower() == ".csv" else "ndjson")
+    reader = csv_rows if file_format == "csv" else ndjson_rows
+    report = await import_products(db, reader(_file_chunks(args.path)), args.batch_size, args.dry_run)
+    for error in report.errors:
+        print(f"row {error['row']}: {error['errors']}")
+    if report.failed > len(report.errors):
+        print(f"... {report.failed - len(report.errors)} more errors")
+    print(json.dumps(report.summary()))
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,235 @@
+"""Per-client rate limits and global admission control.
+
+AdmissionMiddleware runs in front of the routes. Requests matching a
+RouteBudget draw from a token bucket keyed by the caller's user id (from a
+valid bearer token) or, for anonymous callers, the client IP; an empty
+bucket answers 429 with Retry-After. Every request except health checks and metrics then takes a
+ConcurrencyLimiter slot: once `max_in_flight` requests are running, up to
+`max_queue` more wait up to `queue_timeout` seconds for a slot, and the rest
+are shed with 503 and Retry-After rather than piling onto a saturated worker.
+
+Buckets live in process memory by default, so each worker enforces its own
+budget. MongoRateLimitBackend keeps them in a shared collection instead, for
+deployments with several workers or hosts.
+
+The client IP is the ASGI peer address. Behind a reverse proxy that is the
+proxy's own address for every caller, so one busy client would exhaust
+everyone's budget until uvicorn runs with
+`--proxy-headers --forwarded-allow-ips=<proxy address>` and takes the peer
+from the X-Forwarded-For header that proxy sets. Where that can't be done,
+turn `limit_by_ip` off; anonymous requests then skip the budgets entirely.
+"""
+import asyncio
+import json
+import logging
+import math
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+from urllib.parse import parse_qs
+
+from pymongo import ReturnDocument
+
+from auth import verify_token
+from metrics import admission_in_flight, admission_waiting, requests_rejected
+
+logger = logging.getLogger(__name__)
+
+class RouteBudget:
+    """`per_minute` requests per client for matching requests, in bursts of up to `burst`."""
+
+    def __init__(self, name: str, method: str, path: str, per_minute: float, burst: Optional[float] = None,
+                 prefix: bool = False, exclude: tuple = (), query_param: Optional[str] = None,
+                 unless_params: tuple = ()):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.rate = per_minute / 60
+        self.burst = burst or per_minute
+        self.prefix = prefix
+        self.exclude = exclude
+        self.query_param = query_param
+        self.unless_params = unless_params
+
+    def matches(self, method: str, path: str, query: dict) -> bool:
+        if method != self.method or path in self.exclude:
+            return False
+        if not (path.startswith(self.path) if self.prefix else path == self.path):
+            return False
+        if self.query_param and not query.get(self.query_param, [""])[0]:
+            return False
+        return not any(query.get(param) for param in self.unless_params)
+
+class MemoryRateLimitBackend:
+    """Token buckets in this process, least recently used evicted beyond `max_keys`."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+
+    async def take(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+class MongoRateLimitBackend:
+    """Token buckets shared by every worker, one document per client and budget.
+
+    Refill and take happen in one pipeline update, so concurrent requests from
+    different workers can't both spend the last token. Idle buckets expire
+    through the TTL index on `expires_at`.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def take(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        now = datetime.now(timezone.utc)
+        elapsed_seconds = {"$divide": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, 1000]}
+        bucket = await self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {
+                    "tokens": {"$min": [burst, {"$add": [
+                        {"$ifNull": ["$tokens", burst]}, {"$multiply": [elapsed_seconds, rate]}
+                    ]}]},
+                    "updated_at": now,
+                    # A full bucket carries no state worth keeping
+                    "expires_at": now + timedelta(seconds=burst / rate)
+                }},
+                {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                {"$set": {"tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]}}}
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        if bucket['allowed']:
+            return True, 0.0
+        return False, (1 - bucket['tokens']) / rate
+
+class RateLimiter:
+    def __init__(self, budgets: list, backend=None, limit_by_ip: bool = True):
+        self.budgets = budgets
+        self.backend = backend or MemoryRateLimitBackend()
+        self.limit_by_ip = limit_by_ip
+
+    def budget_for(self, scope: dict) -> Optional[RouteBudget]:
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        return next((b for b in self.budgets if b.matches(scope["method"], scope["path"], query)), None)
+
+    def client_key(self, scope: dict) -> Optional[str]:
+        """The bucket owner for this request, or None for an anonymous caller with IP limits off."""
+        headers = dict(scope.get("headers") or [])
+        authorization = headers.get(b"authorization", b"").decode("latin-1")
+        if authorization.startswith("Bearer "):
+            try:
+                user_id = verify_token(authorization[len("Bearer "):]).get("user_id")
+            except Exception:
+                user_id = None
+            if user_id:
+                return f"user:{user_id}"
+        client = scope.get("client")
+        if not self.limit_by_ip or not client:
+            return None
+        return f"ip:{client[0]}"
+
+    async def check(self, scope: dict) -> Optional[Tuple[str, float]]:
+        """(budget name, seconds until a token is free) when the request is over budget."""
+        budget = self.budget_for(scope)
+        if budget is None:
+            return None
+        key = self.client_key(scope)
+        if key is None:
+            return None
+        try:
+            allowed, retry_after = await self.backend.take(f"{budget.name}:{key}", budget.rate, budget.burst)
+        except Exception:
+            # A broken shared backend mustn't take the API down with it
+            logger.exception("Rate limit backend failed; admitting request")
+            return None
+        return None if allowed else (budget.name, retry_after)
+
+class ConcurrencyLimiter:
+    def __init__(self, max_in_flight: int, max_queue: int = 100, queue_timeout: float = 1.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.waiting = 0
+
+    async def acquire(self) -> bool:
+        if not self._slots.locked():
+            await self._slots.acquire()
+            return True
+        if self.waiting >= self.max_queue:
+            return False
+        self.waiting += 1
+        admission_waiting.inc()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+            admission_waiting.dec()
+
+    def release(self):
+        self._slots.release()
+
+async def _reject(send, status_code: int, detail: str, retry_after: float):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status_code,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode())
+        ]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class AdmissionMiddleware:
+    def __init__(self, app, rate_limiter: Optional[RateLimiter] = None,
+                 concurrency: Optional[ConcurrencyLimiter] = None, exempt_paths: tuple = ()):
+        self.app = app
+        self.rate_limiter = rate_limiter
+        self.concurrency = concurrency
+        self.exempt_paths = exempt_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        if self.rate_limiter:
+            limited = await self.rate_limiter.check(scope)
+            if limited:
+                budget, retry_after = limited
+                requests_rejected.inc(("rate_limit", budget))
+                await _reject(send, 429, "Too many requests", retry_after)
+                return
+
+        if self.concurrency is None:
+            await self.app(scope, receive, send)
+            return
+        if not await self.concurrency.acquire():
+            requests_rejected.inc(("overloaded", ""))
+            await _reject(send, 503, "Server is busy, try again shortly", self.concurrency.queue_timeout)
+            return
+        admission_in_flight.inc()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission_in_flight.dec()
+            self.concurrency.release()
@@ -0,0 +1,68 @@
+"""Product rating aggregates.
+
+Products carry a running `rating_sum` and `reviews_count`; `rating` is derived
+from them. Run this module to recompute every product's aggregates from the
+reviews collection:
+
+    python ratings.py
+"""
+import asyncio
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+def add_rating_update(rating: int) -> list:
+    # Update pipeline: bump the running totals and re-derive the average in one atomic write.
+    # Products that predate rating_sum fall back to rating * reviews_count.
+    return [
+        {"$set": {
+            "rating_sum": {"$add": [
+                {"$ifNull": ["$rating_sum", {"$multiply": [
+                    {"$ifNull": ["$rating", 0]}, {"$ifNull": ["$reviews_count", 0]}
+                ]}]},
+                rating
+            ]},
+            "reviews_count": {"$add": [{"$ifNull": ["$reviews_count", 0]}, 1]}
+        }},
+        {"$set": {"rating": {"$divide": ["$rating_sum", "$reviews_count"]}}}
+    ]
+
+async def reconcile_ratings(db) -> int:
+    """Recompute rating aggregates from reviews. Products without reviews are reset to zero."""
+    run_at = datetime.now(timezone.utc)
+
+    await db.reviews.aggregate([
+        {"$group": {"_id": "$product_id", "rating_sum": {"$sum": "$rating"}, "reviews_count": {"$sum": 1}}},
+        {"$project": {
+            "_id": 0,
+            "id": "$_id",
+            "rating_sum": 1,
+            "reviews_count": 1,
+            "rating": {"$divide": ["$rating_sum", "$reviews_count"]},
+            "ratings_reconciled_at": run_at
+        }},
+        {"$merge": {"into": "products", "on": "id", "whenMatched": "merge", "whenNotMatched": "discard"}}
+    ]).to_list(None)
+
+    result = await db.products.update_many(
+        {"ratings_reconciled_at": {"$ne": run_at}},
+        {"$set": {"rating_sum": 0, "reviews_count": 0, "rating": 0.0, "ratings_reconciled_at": run_at}}
+    )
+    return result.modified_count
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+
+    print("Reconciling product ratings...")
+    reset = await reconcile_ratings(db)
+    print(f"Reset {reset} products without reviews")
+    print("Rating reconciliation completed!")
+    client.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+import hashlib
+from functools import lru_cache
+from typing import Hashable, Optional
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from cache import TTLCache
+
+@lru_cache(maxsize=None)
+def _adapter(model) -> TypeAdapter:
+    return TypeAdapter(model)
+
+class CachedResponse:
+    __slots__ = ("body", "etag")
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return "*" in tags or self.etag in tags
+
+class ResponseCache:
+    """Serialized JSON bodies for read-mostly routes, grouped by namespace for invalidation."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300.0, max_age: int = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.cache_control = f"public, max-age={max_age}"
+        self._namespaces = {}
+
+    def _namespace(self, namespace: str) -> TTLCache:
+        if namespace not in self._namespaces:
+            self._namespaces[namespace] = TTLCache(maxsize=self.maxsize, ttl=self.ttl)
+        return self._namespaces[namespace]
+
+    def get(self, namespace: str, key: Hashable = None) -> Optional[CachedResponse]:
+        return self._namespace(namespace).get(key)
+
+    def put(self, namespace: str, key: Hashable, payload, model) -> CachedResponse:
+        # Validate and serialize through the route's response model, as FastAPI would
+        adapter = _adapter(model)
+        entry = CachedResponse(adapter.dump_json(adapter.validate_python(payload)))
+        self._namespace(namespace).set(key, entry)
+        return entry
+
+    def invalidate(self, namespace: str, key: Hashable = None, all_keys: bool = False):
+        if namespace not in self._namespaces:
+            return
+        if all_keys:
+            self._namespaces[namespace].clear()
+        else:
+            self._namespaces[namespace].pop(key)
+
+    def respond(self, request: Request, entry: CachedResponse) -> Response:
+        headers = {"ETag": entry.etag, "Cache-Control": self.cache_control}
+        if entry.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    def stats(self) -> dict:
+        return {namespace: cache.stats() for namespace, cache in self._namespaces.items()}
@@ -0,0 +1,255 @@
+import asyncio
+import bisect
+import heapq
+import logging
+import math
+import re
+from collections import defaultdict
+from typing import List, Optional
+
+# Relative importance of each product field when ranking matches
+FIELD_WEIGHTS = {"name": 3.0, "brand": 2.0, "category": 2.0, "description": 1.0}
+
+# Score multipliers for how a query token matched an indexed token
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.7
+FUZZY_MATCH = 0.5
+
+MIN_FUZZY_LENGTH = 4  # shorter tokens only match exactly or by prefix
+MAX_PREFIX_EXPANSION = 50
+
+_TOKEN_RE = re.compile(r"\w+")
+
+logger = logging.getLogger(__name__)
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.casefold())
+
+def _deletes(token: str) -> set:
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+def _within_one_edit(a: str, b: str) -> bool:
+    # Damerau-Levenshtein distance <= 1 (insert, delete, substitute or swap adjacent)
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la > lb:
+        a, b, la, lb = b, a, lb, la
+    i = 0
+    while i < la and a[i] == b[i]:
+        i += 1
+    if la == lb:
+        if a[i + 1:] == b[i + 1:]:
+            return True
+        return i + 1 < la and a[i] == b[i + 1] and a[i + 1] == b[i] and a[i + 2:] == b[i + 2:]
+    return a[i:] == b[i + 1:]
+
+class ProductSearchIndex:
+    """Case-folded inverted index over product name, brand, category and description.
+
+    The index lives in process memory and is kept current by the product write
+    routes, so each worker process builds its own copy on startup. Writes handled
+    by other workers, other hosts or the import CLI only show up here when the
+    index is rebuilt, which `start` does every `interval` seconds.
+    """
+
+    def __init__(self):
+        self.clear()
+        self._task: Optional[asyncio.Task] = None
+        self._writes_during_build: Optional[list] = None
+
+    def __len__(self):
+        return len(self._doc_tokens)
+
+    def __contains__(self, product_id: str):
+        return product_id in self._doc_tokens
+
+    def clear(self):
+        self._postings = defaultdict(dict)  # token -> {product_id: weight}
+        self._doc_tokens = {}  # product_id -> tokens indexed for it
+        self._doc_filters = {}  # product_id -> (category, brand, price)
+        self._vocabulary = []  # sorted tokens, for prefix lookups
+        self._variants = defaultdict(set)  # single-delete variant -> tokens, for typo lookups
+
+    async def build(self, db):
+        # Build into a fresh index and swap, so searches never see a half-built one.
+        # Writes made here while the scan runs are replayed onto it before the swap.
+        fresh = ProductSearchIndex()
+        self._writes_during_build = []
+        try:
+            projection = {"_id": 0, "id": 1, "price": 1, **{field: 1 for field in FIELD_WEIGHTS}}
+            async for product in db.products.find({}, projection).batch_size(1000):
+                fresh.add(product)
+            for product, product_id in self._writes_during_build:
+                if product:
+                    fresh.add(product)
+                else:
+                    fresh.remove(product_id)
+        finally:
+            self._writes_during_build = None
+        self._postings, self._doc_tokens, self._doc_filters, self._vocabulary, self._variants = (
+            fresh._postings, fresh._doc_tokens, fresh._doc_filters, fresh._vocabulary, fresh._variants
+        )
+
+    async def _refresh(self, db, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.build(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Product search index rebuild failed; keeping the current one")
+
+    def start(self, db, interval: float):
+        """Rebuild from the database every `interval` seconds."""
+        self._task = asyncio.create_task(self._refresh(db, interval))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def add(self, product: dict):
+        if self._writes_during_build is not None:
+            self._writes_during_build.append((product, None))
+        product_id = product['id']
+        self._discard(product_id)
+
+        weights = defaultdict(float)
+        for field, field_weight in FIELD_WEIGHTS.items():
+            counts = defaultdict(int)
+            for token in tokenize(product.get(field) or ""):
+                counts[token] += 1
+            for token, count in counts.items():
+                weights[token] += field_weight * (1 + math.log(count))
+
+        for token, weight in weights.items():
+            if token not in self._postings:
+                self._add_token(token)
+            self._postings[token][product_id] = weight
+
+        self._doc_tokens[product_id] = set(weights)
+        self._doc_filters[product_id] = (product.get('category'), product.get('brand'), product.get('price'))
+
+    def remove(self, product_id: str):
+        if self._writes_during_build is not None:
+            self._writes_during_build.append((None, product_id))
+        self._discard(product_id)
+
+    def _discard(self, product_id: str):
+        tokens = self._doc_tokens.pop(product_id, None)
+        if tokens is None:
+            return
+        self._doc_filters.pop(product_id, None)
+        for token in tokens:
+            postings = self._postings[token]
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[token]
+                self._remove_token(token)
+
+    def _add_token(self, token: str):
+        bisect.insort(self._vocabulary, token)
+        if len(token) >= MIN_FUZZY_LENGTH:
+            for variant in _deletes(token):
+                self._variants[variant].add(token)
+
+    def _remove_token(self, token: str):
+        i = bisect.bisect_left(self._vocabulary, token)
+        if i < len(self._vocabulary) and self._vocabulary[i] == token:
+            del self._vocabulary[i]
+        if len(token) >= MIN_FUZZY_LENGTH:
+            for variant in _deletes(token):
+                tokens = self._variants.get(variant)
+                if tokens is not None:
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._variants[variant]
+
+    def _expand(self, query_token: str) -> dict:
+        # Indexed tokens a query token can stand for, with their match multiplier
+        matches = {}
+
+        i = bisect.bisect_left(self._vocabulary, query_token)
+        for token in self._vocabulary[i:i + MAX_PREFIX_EXPANSION]:
+            if not token.startswith(query_token):
+                break
+            matches[token] = EXACT_MATCH if token == query_token else PREFIX_MATCH
+
+        if len(query_token) >= MIN_FUZZY_LENGTH:
+            candidates = set(self._variants.get(query_token, ()))
+            for variant in _deletes(query_token):
+                if variant in self._postings:
+                    candidates.add(variant)
+                candidates.update(self._variants.get(variant, ()))
+            for token in candidates:
+                if token not in matches and _within_one_edit(query_token, token):
+                    matches[token] = FUZZY_MATCH
+
+        return matches
+
+    def search(
+        self,
+        text: str,
+        limit: Optional[int] = None,
+        category: Optional[str] = None,
+        brand: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None
+    ) -> List[str]:
+        """Return ids of products matching every token in `text`, best match first."""
+        query_tokens = list(dict.fromkeys(tokenize(text)))
+        if not query_tokens:
+            return []
+
+        total = len(self._doc_tokens)
+        scores = None
+        for query_token in query_tokens:
+            # A product's score for this query token is its best-scoring matched token
+            token_scores = {}
+            for token, multiplier in self._expand(query_token).items():
+                postings = self._postings[token]
+                factor = multiplier * math.log(1 + total / len(postings))
+                if not token_scores:
+                    token_scores = {pid: weight * factor for pid, weight in postings.items()}
+                    continue
+                best = token_scores.get
+                for pid, weight in postings.items():
+                    score = weight * factor
+                    if score > best(pid, 0):
+                        token_scores[pid] = score
+
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {pid: s + token_scores[pid] for pid, s in scores.items() if pid in token_scores}
+            if not scores:
+                return []
+
+        if category or brand or min_price is not None or max_price is not None:
+            scores = {
+                pid: s for pid, s in scores.items()
+                if self._passes_filters(pid, category, brand, min_price, max_price)
+            }
+
+        if limit is not None:
+            return heapq.nlargest(limit, scores, key=scores.__getitem__)
+        return sorted(scores, key=scores.__getitem__, reverse=True)
+
+    def _passes_filters(self, product_id, category, brand, min_price, max_price) -> bool:
+        p_category, p_brand, p_price = self._doc_filters[product_id]
+        if category and p_category != category:
+            return False
+        if brand and p_brand != brand:
+            return False
+        if min_price is not None and (p_price is None or p_price < min_price):
+            return False
+        if max_price is not None and (p_price is None or p_price > max_price):
+            return False
+        return True
@@ -4,6 +4,8 @@ from dotenv import load_dotenv
 from pathlib import Path
 import os
 from datetime import datetime, timezone
+from indexes import ensure_indexes
+from stats import rebuild_stats
 
 # Load environment
 ROOT_DIR = Path(__file__).parent
@@ -53,7 +55,7 @@ products = [
         "stock": 25,
         "rating": 4.5,
         "reviews_count": 128,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": "prod-2",
@@ -67,7 +69,7 @@ products = [
         "stock": 50,
         "rating": 4.8,
         "reviews_count": 256,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": "prod-3",
@@ -81,7 +83,7 @@ products = [
         "stock": 30,
         "rating": 4.3,
         "reviews_count": 89,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": "prod-4",
@@ -95,7 +97,7 @@ products = [
         "stock": 15,
         "rating": 4.7,
         "reviews_count": 67,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": "prod-5",
@@ -109,7 +111,7 @@ products = [
         "stock": 40,
         "rating": 4.2,
         "reviews_count": 45,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": "prod-6",
@@ -123,7 +125,7 @@ products = [
         "stock": 20,
         "rating": 4.6,
         "reviews_count": 112,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": "prod-7",
@@ -137,7 +139,7 @@ products = [
         "stock": 35,
         "rating": 4.4,
         "reviews_count": 78,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": "prod-8",
@@ -151,7 +153,7 @@ products = [
         "stock": 18,
         "rating": 4.5,
         "reviews_count": 92,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": "prod-9",
@@ -165,7 +167,7 @@ products = [
         "stock": 28,
         "rating": 4.3,
         "reviews_count": 56,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": "prod-10",
@@ -179,7 +181,7 @@ products = [
         "stock": 22,
         "rating": 4.7,
         "reviews_count": 134,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": "prod-11",
@@ -193,7 +195,7 @@ products = [
         "stock": 12,
         "rating": 4.9,
         "reviews_count": 203,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": "prod-12",
@@ -207,7 +209,7 @@ products = [
         "stock": 45,
         "rating": 4.4,
         "reviews_count": 167,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
 ]
 
@@ -220,7 +222,7 @@ blogs = [
         "content": "Replacing your smartphone battery can extend the life of your device significantly...",
         "image": "https://images.unsplash.com/photo-1556656793-08538906a9f8?w=800",
         "author": "Sparible Team",
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": "blog-2",
@@ -229,7 +231,7 @@ blogs = [
         "content": "A damaged laptop screen can significantly impact your productivity...",
         "image": "https://images.unsplash.com/photo-1517694712202-14dd9538aa97?w=800",
         "author": "Sparible Team",
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
     {
         "id": "blog-3",
@@ -238,7 +240,7 @@ blogs = [
         "content": "When it comes to repairing your smartphone, choosing the right spare parts is crucial...",
         "image": "https://images.unsplash.com/photo-1512499617640-c74ae3a79d37?w=800",
         "author": "Sparible Team",
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     },
 ]
 
@@ -251,6 +253,10 @@ async def seed_database():
     await db.products.delete_many({})
     await db.blogs.delete_many({})
     
+    # Create indexes
+    await ensure_indexes(db)
+    print("Ensured indexes")
+    
     # Insert categories
     await db.categories.insert_many(categories)
     print(f"Inserted {len(categories)} categories")
@@ -276,7 +282,7 @@ async def seed_database():
         "name": "Admin User",
         "phone": "+91-9022967380",
         "is_admin": True,
-        "created_at": datetime.now(timezone.utc).isoformat()
+        "created_at": datetime.now(timezone.utc)
     }
     
     existing_admin = await db.users.find_one({"email": "admin@sparible.com"})
@@ -284,6 +290,10 @@ async def seed_database():
         await db.users.insert_one(admin_user)
         print("Created admin user (email: admin@sparible.com, password: admin123)")
     
+    # Rebuild dashboard counters
+    await rebuild_stats(db)
+    print("Rebuilt admin stats")
+    
     print("Database seeding completed!")
     client.close()
 
@@ -0,0 +1,44 @@
+import os
+from functools import lru_cache
+from typing import Type
+
+import orjson
+from fastapi import Response
+from pydantic import BaseModel
+
+# Opt-in: trusted list routes skip response-model validation and encode with orjson
+FAST_LIST_RESPONSES = os.getenv("FAST_LIST_RESPONSES", "false").lower() == "true"
+
+class ORJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+@lru_cache(maxsize=None)
+def projection(model: Type[BaseModel]) -> dict:
+    # Fetch exactly the model's fields, so unvalidated documents can't leak anything else
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+@lru_cache(maxsize=None)
+def _static_defaults(model: Type[BaseModel]) -> tuple:
+    return tuple(
+        (name, field.default) for name, field in model.model_fields.items()
+        if not field.is_required() and field.default_factory is None
+    )
+
+def list_response(response: Response, docs: list, model: Type[BaseModel]):
+    """Return `docs` from a route declared with response_model=List[model].
+
+    The documents must come from a query using `projection(model)` on data this
+    app wrote. On the fast path they are only topped up with missing defaults
+    before encoding; otherwise FastAPI validates them as usual.
+    """
+    if not FAST_LIST_RESPONSES:
+        return docs
+    defaults = _static_defaults(model)
+    for doc in docs:
+        for name, default in defaults:
+            if name not in doc:
+                doc[name] = default
+    return ORJSONResponse(docs, headers=dict(response.headers))
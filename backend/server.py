@@ -1,41 +1,193 @@
-from fastapi import FastAPI, APIRouter, HTTPException, status, Header, Depends
+from fastapi import FastAPI, APIRouter, HTTPException, status, Header, Depends, Query, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.responses import StreamingResponse
+from pymongo.errors import DuplicateKeyError
 import os
+import uuid
 import logging
+from collections import deque
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import List, Optional
-from datetime import datetime
-import razorpay
+from datetime import datetime, timezone
+
+ROOT_DIR = Path(__file__).parent
+# Before the local imports below, which read their settings at import time.
+# Deployments that set the environment directly never import dotenv.
+if (ROOT_DIR / '.env').exists():
+    from dotenv import load_dotenv
+    load_dotenv(ROOT_DIR / '.env')
 
 from models import (
-    User, UserRegister, UserLogin, Product, ProductCreate, Category, Brand,
-    Cart, CartItem, Wishlist, WishlistItem, Order, OrderCreate, OrderItem,
+    User, UserRegister, UserLogin, Product, ProductCreate, ProductBatch, ProductBatchRequest, ProductFacets,
+    Category, Brand, Cart, CartItem, Wishlist, WishlistItem, Order, OrderCreate, OrderItem,
     Review, ReviewCreate, BlogPost, BlogPostCreate
 )
-from auth import verify_password, get_password_hash, create_access_token, verify_token
+from auth import create_access_token, verify_token, user_token_data, user_from_claims
+from cache import TTLCache
+from hashing import PasswordHasher
+from carts import add_item_update, checkout_totals, delivery_charge, hydrated_cart_pipeline, unit_price
+from inventory import commit_stock, release_stock, reserve_stock
+from response_cache import ResponseCache
+from serialization import list_response, projection
+from indexes import ensure_indexes, explain_route_queries, index_stats
+from search import ProductSearchIndex
+from facets import facet_cache_key, facet_pipeline, facet_result
+from pagination import MAX_PAGE_SIZE, encode_cursor, fetch_page, offset_from_cursor
+from ratings import add_rating_update
+from stats import StatsCache, increment_stats, rebuild_stats
+from payments import CircuitBreaker, GatewayUnavailable, PaymentGatewayError, RazorpayGateway, RAZORPAY_API_URL
+from payment_events import (
+    PaymentEventWorker, PaymentReconciler, enqueue_event, parse_webhook, settle_expired_order, verify_webhook_signature
+)
+from product_import import IMPORT_BATCH_SIZE, csv_rows, import_products, ndjson_rows
+from metrics import MetricsMiddleware, MongoCommandMetrics, MongoPoolMetrics, registry as metrics_registry
+from mongo import pool_options, ping, warm_up
+from slow_queries import SlowQueryRecorder
+from rate_limit import AdmissionMiddleware, ConcurrencyLimiter, MongoRateLimitBackend, RateLimiter, RouteBudget
+from exports import EXPORT_BATCH_SIZE, ORDER_CSV_FIELDS, csv_chunks, ndjson_chunks, order_export_query
 
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
+# Everything that opens connections, starts threads or configures logging happens in
+# lifespan(); importing this module only defines the app.
+logger = logging.getLogger(__name__)
+
+# MongoDB connection, created by lifespan() so the pool is warm before the first request
+client = None
+db = None
+mongo_metrics = MongoCommandMetrics()
+mongo_pool_metrics = MongoPoolMetrics()
+# Slow-query log, created by lifespan() when SLOW_QUERY_MS is set
+slow_queries: Optional[SlowQueryRecorder] = None
+READY_PING_TIMEOUT = float(os.getenv("READY_PING_TIMEOUT", "1"))
+
+def connect_mongo():
+    # Motor loads here rather than at import; pymongo itself is already needed for the listeners
+    from motor.motor_asyncio import AsyncIOMotorClient
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+    listeners = [mongo_metrics, mongo_pool_metrics] + ([slow_queries] if slow_queries else [])
+    return AsyncIOMotorClient(os.environ['MONGO_URL'], tz_aware=True, event_listeners=listeners, **pool_options())
 
-# Razorpay client (will work once keys are added)
+# Razorpay client (will work once keys are added), created by lifespan()
 RAZORPAY_KEY_ID = os.getenv("RAZORPAY_KEY_ID", "")
 RAZORPAY_KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET", "")
+razorpay_client: Optional[RazorpayGateway] = None
+
+# Throughput of recent bulk imports handled by this worker, newest first
+recent_imports = deque(maxlen=20)
+
+# Webhook events are queued in payment_events and applied to orders in batches
+RAZORPAY_WEBHOOK_SECRET = os.getenv("RAZORPAY_WEBHOOK_SECRET", "")
+# (both created by lifespan() once the database is connected)
+payment_worker: Optional[PaymentEventWorker] = None
+payment_reconciler: Optional[PaymentReconciler] = None
+
+# In-memory product search index, built on startup
+product_search = ProductSearchIndex()
+
+# bcrypt runs in this pool, off the event loop; created by lifespan()
+password_hasher: Optional[PasswordHasher] = None
+
+# Serialized catalog responses with ETags, invalidated by the admin write routes
+catalog_cache = ResponseCache(
+    ttl=float(os.getenv("CATALOG_CACHE_TTL", "300")),
+    max_age=int(os.getenv("CATALOG_CACHE_MAX_AGE", "60"))
+)
+
+# Admin dashboard counters, cached briefly in front of the materialized stats document
+admin_stats = StatsCache(ttl=float(os.getenv("STATS_CACHE_TTL", "10")))
+
+# "starting" until startup finishes, "stopping" once shutdown begins; gates /readyz
+app_status = "starting"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client, db, slow_queries, razorpay_client, password_hasher, payment_worker, payment_reconciler, app_status
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    slow_query_ms = float(os.getenv("SLOW_QUERY_MS", "0"))
+    if slow_query_ms > 0:
+        slow_queries = SlowQueryRecorder(
+            threshold_ms=slow_query_ms,
+            capacity=int(os.getenv("SLOW_QUERY_LOG_SIZE", "200"))
+        )
+    client = connect_mongo()
+    db = client[os.environ['DB_NAME']]
+    warm_seconds = await warm_up(client, pool_options()['minPoolSize'])
+    logger.info(f"MongoDB pool warmed in {warm_seconds * 1000:.0f} ms: {mongo_pool_metrics.snapshot()}")
+
+    index_failures = await ensure_indexes(db)
+    if index_failures:
+        logger.warning(f"MongoDB indexes ensured except {len(index_failures)}: "
+                       f"{', '.join(f'{c}.{name}' for c, name, _ in index_failures)}")
+    else:
+        logger.info("MongoDB indexes ensured")
+    await product_search.build(db)
+    logger.info(f"Product search index built with {len(product_search)} products")
+    # Picks up product writes made by other workers and the import CLI
+    search_refresh = float(os.getenv("SEARCH_INDEX_REFRESH", "60"))
+    if search_refresh > 0:
+        product_search.start(db, search_refresh)
+
+    if RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET:
+        razorpay_client = RazorpayGateway(
+            RAZORPAY_KEY_ID,
+            RAZORPAY_KEY_SECRET,
+            base_url=os.getenv("RAZORPAY_API_URL", RAZORPAY_API_URL),
+            timeout=float(os.getenv("RAZORPAY_TIMEOUT", "5")),
+            max_connections=int(os.getenv("RAZORPAY_MAX_CONNECTIONS", "20")),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("RAZORPAY_BREAKER_FAILURES", "5")),
+                reset_timeout=float(os.getenv("RAZORPAY_BREAKER_RESET", "30"))
+            )
+        )
+    password_hasher = PasswordHasher(max_workers=int(os.getenv("PASSWORD_HASH_WORKERS", "4")))
+
+    payment_worker = PaymentEventWorker(
+        db,
+        batch_size=int(os.getenv("PAYMENT_WORKER_BATCH", "500")),
+        interval=float(os.getenv("PAYMENT_WORKER_INTERVAL", "1"))
+    )
+    payment_reconciler = PaymentReconciler(
+        db,
+        razorpay_client,
+        payment_worker,
+        interval=float(os.getenv("PAYMENT_RECONCILE_INTERVAL", "300")),
+        stale_after=float(os.getenv("PAYMENT_PENDING_STALE_AFTER", "900")),
+        expire_after=float(os.getenv("PAYMENT_PENDING_EXPIRE_AFTER", "86400")),
+        on_restock=forget_products
+    )
+    payment_worker.start()
+    payment_reconciler.start()
+    if slow_queries:
+        slow_queries.start(db)
+    # Shared buckets for deployments running several workers
+    if rate_limiter and os.getenv("RATE_LIMIT_BACKEND", "memory") == "mongo":
+        rate_limiter.backend = MongoRateLimitBackend(db.rate_limits)
+    if rate_limiter and not rate_limiter.limit_by_ip:
+        logger.warning("RATE_LIMIT_BY_IP is off: anonymous requests, including login and register, "
+                       "are not rate limited")
 
-if RAZORPAY_KEY_ID and RAZORPAY_KEY_SECRET:
-    razorpay_client = razorpay.Client(auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET))
-else:
-    razorpay_client = None
+    app_status = "ready"
+    try:
+        yield
+    finally:
+        app_status = "stopping"
+        await payment_worker.stop()
+        await payment_reconciler.stop()
+        await product_search.stop()
+        if slow_queries:
+            await slow_queries.stop()
+        client.close()
+        password_hasher.shutdown()
+        if razorpay_client:
+            await razorpay_client.aclose()
 
 # Create the main app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -43,6 +195,60 @@ api_router = APIRouter(prefix="/api")
 # Security
 security = HTTPBearer()
 
+# Authenticated user cache, keyed by user id
+user_cache = TTLCache(
+    maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("USER_CACHE_TTL", "60"))
+)
+
+async def load_user(user_id: str) -> Optional[dict]:
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+        if user:
+            user_cache.set(user_id, user)
+    return user
+
+def invalidate_user(user_id: str):
+    # Call whenever a user record is modified
+    user_cache.pop(user_id)
+
+# Product documents by id, for existence checks and lookups that tolerate brief staleness
+product_cache = TTLCache(
+    maxsize=int(os.getenv("PRODUCT_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PRODUCT_CACHE_TTL", "30"))
+)
+
+async def forget_products(product_ids: List[str]):
+    # Drop cached copies of products whose stock changed outside a product route
+    for product_id in product_ids:
+        product_cache.pop(product_id)
+        catalog_cache.invalidate("product", product_id)
+
+async def get_cached_product(product_id: str) -> Optional[dict]:
+    product = product_cache.get(product_id)
+    if product is None:
+        product = await db.products.find_one({"id": product_id}, {"_id": 0})
+        if product:
+            product_cache.set(product_id, product)
+    return product
+
+async def get_cached_products(product_ids: List[str]) -> dict:
+    # Resolve many ids at once: cache hits first, then one $in query for the rest
+    products = {}
+    uncached = []
+    for product_id in product_ids:
+        product = product_cache.get(product_id)
+        if product is None:
+            uncached.append(product_id)
+        else:
+            products[product_id] = product
+    if uncached:
+        async for product in db.products.find({"id": {"$in": uncached}}, {"_id": 0}):
+            product_cache.set(product['id'], product)
+            products[product['id']] = product
+    return products
+
 # Dependency to get current user
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     token = credentials.credentials
@@ -51,7 +257,7 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     if not user_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
     
-    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
+    user = user_from_claims(payload) or await load_user(user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return user
@@ -65,8 +271,7 @@ async def get_current_user_optional(authorization: Optional[str] = Header(None))
         payload = verify_token(token)
         user_id = payload.get("user_id")
         if user_id:
-            user = await db.users.find_one({"id": user_id}, {"_id": 0, "password": 0})
-            return user
+            return user_from_claims(payload) or await load_user(user_id)
     except:
         return None
     return None
@@ -81,7 +286,7 @@ async def register(user_data: UserRegister):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
     
     # Create user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await password_hasher.hash(user_data.password)
     user = User(
         email=user_data.email,
         name=user_data.name,
@@ -89,12 +294,12 @@ async def register(user_data: UserRegister):
     )
     user_dict = user.model_dump()
     user_dict['password'] = hashed_password
-    user_dict['created_at'] = user_dict['created_at'].isoformat()
     
     await db.users.insert_one(user_dict)
+    await increment_stats(db, total_users=1)
     
     # Create access token
-    access_token = create_access_token(data={"user_id": user.id})
+    access_token = create_access_token(data=user_token_data(user_dict))
     
     return {
         "access_token": access_token,
@@ -105,11 +310,20 @@ async def register(user_data: UserRegister):
 @api_router.post("/auth/login")
 async def login(credentials: UserLogin):
     user = await db.users.find_one({"email": credentials.email})
-    if not user or not verify_password(credentials.password, user['password']):
+    if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
     
+    valid, new_hash = await password_hasher.verify_and_update(credentials.password, user['password'])
+    if not valid:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    
+    # Rehash when the configured bcrypt cost has changed
+    if new_hash:
+        await db.users.update_one({"id": user['id']}, {"$set": {"password": new_hash}})
+        invalidate_user(user['id'])
+    
     # Create access token
-    access_token = create_access_token(data={"user_id": user['id']})
+    access_token = create_access_token(data=user_token_data(user))
     
     # Remove password from response
     user.pop('password', None)
@@ -123,18 +337,21 @@ async def login(credentials: UserLogin):
 
 @api_router.get("/auth/me")
 async def get_me(current_user: dict = Depends(get_current_user)):
-    return current_user
+    # In signed-claims mode current_user only holds the token fields
+    return await load_user(current_user['id']) or current_user
 
 # ============= PRODUCTS ROUTES =============
 
 @api_router.get("/products", response_model=List[Product])
 async def get_products(
+    response: Response,
     category: Optional[str] = None,
     brand: Optional[str] = None,
     search: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
-    limit: int = 50
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
 ):
     query = {}
     if category:
@@ -142,7 +359,17 @@ async def get_products(
     if brand:
         query['brand'] = brand
     if search:
-        query['name'] = {'$regex': search, '$options': 'i'}
+        # Rank through the search index and only ask Mongo for the matching ids
+        offset = offset_from_cursor(cursor)
+        ranked_ids = product_search.search(
+            search, limit=offset + limit + 1, category=category, brand=brand, min_price=min_price, max_price=max_price
+        )
+        product_ids = ranked_ids[offset:offset + limit]
+        if len(ranked_ids) > offset + limit:
+            response.headers['X-Next-Cursor'] = encode_cursor([offset + limit])
+        if not product_ids:
+            return []
+        query['id'] = {'$in': product_ids}
     if min_price is not None or max_price is not None:
         query['price'] = {}
         if min_price is not None:
@@ -150,25 +377,73 @@ async def get_products(
         if max_price is not None:
             query['price']['$lte'] = max_price
     
-    products = await db.products.find(query, {"_id": 0}).limit(limit).to_list(limit)
+    if search:
+        products = await db.products.find(query, projection(Product)).to_list(limit)
+        rank = {product_id: i for i, product_id in enumerate(product_ids)}
+        products.sort(key=lambda p: rank[p['id']])
+    else:
+        products, next_cursor = await fetch_page(db.products, query, limit, cursor, projection=projection(Product))
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
     
-    # Convert ISO strings back to datetime
-    for product in products:
-        if isinstance(product.get('created_at'), str):
-            product['created_at'] = datetime.fromisoformat(product['created_at'])
+    return list_response(response, products, Product)
+
+MAX_BATCH_IDS = 200
+
+async def _product_batch(ids: List[str]) -> dict:
+    # Accept repeated and comma-separated ids; keep first-seen order
+    product_ids = list(dict.fromkeys(pid for value in ids for pid in value.split(",") if pid))
+    if len(product_ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_IDS} product ids per request"
+        )
     
-    return products
+    found = await get_cached_products(product_ids)
+    return {
+        "products": [found[pid] for pid in product_ids if pid in found],
+        "missing": [pid for pid in product_ids if pid not in found]
+    }
+
+@api_router.get("/products/facets", response_model=ProductFacets)
+async def get_product_facets(
+    request: Request,
+    category: Optional[str] = None,
+    brand: Optional[str] = None,
+    search: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None
+):
+    key = facet_cache_key(category, brand, search, min_price, max_price)
+    cached = catalog_cache.get("facets", key)
+    if cached is None:
+        # Search narrows the set for every facet; the other filters are applied per facet
+        product_ids = product_search.search(search) if search else None
+        facets = await db.products.aggregate(
+            facet_pipeline(key[0], key[1], product_ids, min_price, max_price)
+        ).to_list(1)
+        cached = catalog_cache.put("facets", key, facet_result(facets[0] if facets else {}), ProductFacets)
+    
+    return catalog_cache.respond(request, cached)
+
+@api_router.get("/products/batch", response_model=ProductBatch)
+async def get_products_batch(ids: List[str] = Query(...)):
+    return await _product_batch(ids)
+
+@api_router.post("/products/batch", response_model=ProductBatch)
+async def post_products_batch(request: ProductBatchRequest):
+    return await _product_batch(request.ids)
 
 @api_router.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
-    if not product:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
-    
-    if isinstance(product.get('created_at'), str):
-        product['created_at'] = datetime.fromisoformat(product['created_at'])
-    
-    return product
+async def get_product(product_id: str, request: Request):
+    cached = catalog_cache.get("product", product_id)
+    if cached is None:
+        product = await get_cached_product(product_id)
+        if not product:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
+        cached = catalog_cache.put("product", product_id, product, Product)
+    
+    return catalog_cache.respond(request, cached)
 
 @api_router.post("/products", response_model=Product)
 async def create_product(product_data: ProductCreate, current_user: dict = Depends(get_current_user)):
@@ -178,9 +453,11 @@ async def create_product(product_data: ProductCreate, current_user: dict = Depen
     
     product = Product(**product_data.model_dump())
     product_dict = product.model_dump()
-    product_dict['created_at'] = product_dict['created_at'].isoformat()
     
     await db.products.insert_one(product_dict)
+    await increment_stats(db, total_products=1)
+    product_search.add(product_dict)
+    catalog_cache.invalidate("facets", all_keys=True)
     return product
 
 @api_router.put("/products/{product_id}", response_model=Product)
@@ -197,9 +474,10 @@ async def update_product(product_id: str, product_data: ProductCreate, current_u
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
     
     product = await db.products.find_one({"id": product_id}, {"_id": 0})
-    if isinstance(product.get('created_at'), str):
-        product['created_at'] = datetime.fromisoformat(product['created_at'])
-    
+    product_cache.pop(product_id)
+    catalog_cache.invalidate("product", product_id)
+    catalog_cache.invalidate("facets", all_keys=True)
+    product_search.add(product)
     return product
 
 @api_router.delete("/products/{product_id}")
@@ -211,92 +489,88 @@ async def delete_product(product_id: str, current_user: dict = Depends(get_curre
     if result.deleted_count == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
     
+    await increment_stats(db, total_products=-1)
+    product_cache.pop(product_id)
+    catalog_cache.invalidate("product", product_id)
+    catalog_cache.invalidate("facets", all_keys=True)
+    product_search.remove(product_id)
     return {"message": "Product deleted successfully"}
 
 # ============= CATEGORIES ROUTES =============
 
 @api_router.get("/categories", response_model=List[Category])
-async def get_categories(type: Optional[str] = None):
-    query = {}
-    if type:
-        query['type'] = type
-    categories = await db.categories.find(query, {"_id": 0}).to_list(100)
-    return categories
+async def get_categories(request: Request, type: Optional[str] = None):
+    cached = catalog_cache.get("categories", type)
+    if cached is None:
+        query = {}
+        if type:
+            query['type'] = type
+        categories = await db.categories.find(query, {"_id": 0}).to_list(100)
+        cached = catalog_cache.put("categories", type, categories, List[Category])
+    
+    return catalog_cache.respond(request, cached)
 
 # ============= BRANDS ROUTES =============
 
 @api_router.get("/brands", response_model=List[Brand])
-async def get_brands(type: Optional[str] = None):
-    query = {}
-    if type:
-        query['type'] = type
-    brands = await db.brands.find(query, {"_id": 0}).to_list(100)
-    return brands
+async def get_brands(request: Request, type: Optional[str] = None):
+    cached = catalog_cache.get("brands", type)
+    if cached is None:
+        query = {}
+        if type:
+            query['type'] = type
+        brands = await db.brands.find(query, {"_id": 0}).to_list(100)
+        cached = catalog_cache.put("brands", type, brands, List[Brand])
+    
+    return catalog_cache.respond(request, cached)
 
 # ============= CART ROUTES =============
 
 @api_router.get("/cart")
-async def get_cart(current_user: dict = Depends(get_current_user)):
-    cart = await db.carts.find_one({"user_id": current_user['id']}, {"_id": 0})
+async def get_cart(hydrate: bool = False, current_user: dict = Depends(get_current_user)):
+    if hydrate:
+        # Lines joined with current product data and priced server-side, in one aggregation
+        carts = await db.carts.aggregate(hydrated_cart_pipeline(current_user['id'])).to_list(1)
+        cart = carts[0] if carts else None
+    else:
+        cart = await db.carts.find_one({"user_id": current_user['id']}, {"_id": 0})
     if not cart:
-        # Create empty cart
+        # Create empty cart (upsert, so concurrent first requests don't collide)
         cart = Cart(user_id=current_user['id'])
         cart_dict = cart.model_dump()
-        cart_dict['updated_at'] = cart_dict['updated_at'].isoformat()
-        await db.carts.insert_one(cart_dict)
+        await db.carts.update_one({"user_id": current_user['id']}, {"$setOnInsert": cart_dict}, upsert=True)
+        if hydrate:
+            return {**cart_dict, "item_count": 0, "subtotal": 0, "discount": 0, **checkout_totals(0)}
         return cart
     
-    if isinstance(cart.get('updated_at'), str):
-        cart['updated_at'] = datetime.fromisoformat(cart['updated_at'])
-    
+    if hydrate:
+        cart.update(checkout_totals(cart['subtotal']))
     return cart
 
 @api_router.post("/cart/add")
 async def add_to_cart(item: CartItem, current_user: dict = Depends(get_current_user)):
     # Check if product exists
-    product = await db.products.find_one({"id": item.product_id})
-    if not product:
+    if not await get_cached_product(item.product_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
     
-    # Get or create cart
-    cart = await db.carts.find_one({"user_id": current_user['id']})
-    if not cart:
-        cart = Cart(user_id=current_user['id'], items=[item.model_dump()])
-        cart_dict = cart.model_dump()
-        cart_dict['updated_at'] = cart_dict['updated_at'].isoformat()
-        await db.carts.insert_one(cart_dict)
-    else:
-        # Check if item already in cart
-        items = cart.get('items', [])
-        found = False
-        for i, cart_item in enumerate(items):
-            if cart_item['product_id'] == item.product_id:
-                items[i]['quantity'] += item.quantity
-                found = True
-                break
-        
-        if not found:
-            items.append(item.model_dump())
-        
-        await db.carts.update_one(
-            {"user_id": current_user['id']},
-            {"$set": {"items": items, "updated_at": datetime.now().isoformat()}}
-        )
+    # Increment the existing line or append a new one, creating the cart if needed, in one write
+    update = add_item_update(item.product_id, item.quantity, datetime.now(timezone.utc))
+    try:
+        await db.carts.update_one({"user_id": current_user['id']}, update, upsert=True)
+    except DuplicateKeyError:
+        # Lost a race to create the cart; it exists now
+        await db.carts.update_one({"user_id": current_user['id']}, update)
     
     return {"message": "Item added to cart"}
 
 @api_router.post("/cart/remove")
 async def remove_from_cart(product_id: str, current_user: dict = Depends(get_current_user)):
-    cart = await db.carts.find_one({"user_id": current_user['id']})
-    if not cart:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart not found")
-    
-    items = [item for item in cart.get('items', []) if item['product_id'] != product_id]
-    
-    await db.carts.update_one(
+    result = await db.carts.update_one(
         {"user_id": current_user['id']},
-        {"$set": {"items": items, "updated_at": datetime.now().isoformat()}}
+        {"$pull": {"items": {"product_id": product_id}}, "$set": {"updated_at": datetime.now(timezone.utc)}}
     )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Cart not found")
     
     return {"message": "Item removed from cart"}
 
@@ -304,7 +578,7 @@ async def remove_from_cart(product_id: str, current_user: dict = Depends(get_cur
 async def clear_cart(current_user: dict = Depends(get_current_user)):
     await db.carts.update_one(
         {"user_id": current_user['id']},
-        {"$set": {"items": [], "updated_at": datetime.now().isoformat()}}
+        {"$set": {"items": [], "updated_at": datetime.now(timezone.utc)}}
     )
     return {"message": "Cart cleared"}
 
@@ -316,108 +590,198 @@ async def get_wishlist(current_user: dict = Depends(get_current_user)):
     if not wishlist:
         wishlist = Wishlist(user_id=current_user['id'])
         wishlist_dict = wishlist.model_dump()
-        wishlist_dict['updated_at'] = wishlist_dict['updated_at'].isoformat()
-        await db.wishlists.insert_one(wishlist_dict)
+        await db.wishlists.update_one({"user_id": current_user['id']}, {"$setOnInsert": wishlist_dict}, upsert=True)
         return wishlist
     
-    if isinstance(wishlist.get('updated_at'), str):
-        wishlist['updated_at'] = datetime.fromisoformat(wishlist['updated_at'])
-    
     return wishlist
 
 @api_router.post("/wishlist/add")
 async def add_to_wishlist(product_id: str, current_user: dict = Depends(get_current_user)):
     # Check if product exists
-    product = await db.products.find_one({"id": product_id})
-    if not product:
+    if not await get_cached_product(product_id):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Product not found")
     
-    wishlist = await db.wishlists.find_one({"user_id": current_user['id']})
-    if not wishlist:
-        wishlist = Wishlist(user_id=current_user['id'], items=[product_id])
-        wishlist_dict = wishlist.model_dump()
-        wishlist_dict['updated_at'] = wishlist_dict['updated_at'].isoformat()
-        await db.wishlists.insert_one(wishlist_dict)
-    else:
-        items = wishlist.get('items', [])
-        if product_id not in items:
-            items.append(product_id)
-            await db.wishlists.update_one(
-                {"user_id": current_user['id']},
-                {"$set": {"items": items, "updated_at": datetime.now().isoformat()}}
-            )
+    update = {
+        "$addToSet": {"items": product_id},
+        "$set": {"updated_at": datetime.now(timezone.utc)},
+        "$setOnInsert": {"id": str(uuid.uuid4())}
+    }
+    try:
+        await db.wishlists.update_one({"user_id": current_user['id']}, update, upsert=True)
+    except DuplicateKeyError:
+        # Lost a race to create the wishlist; it exists now
+        await db.wishlists.update_one({"user_id": current_user['id']}, update)
     
     return {"message": "Item added to wishlist"}
 
 @api_router.post("/wishlist/remove")
 async def remove_from_wishlist(product_id: str, current_user: dict = Depends(get_current_user)):
-    wishlist = await db.wishlists.find_one({"user_id": current_user['id']})
-    if not wishlist:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Wishlist not found")
-    
-    items = [item for item in wishlist.get('items', []) if item != product_id]
-    
-    await db.wishlists.update_one(
+    result = await db.wishlists.update_one(
         {"user_id": current_user['id']},
-        {"$set": {"items": items, "updated_at": datetime.now().isoformat()}}
+        {"$pull": {"items": product_id}, "$set": {"updated_at": datetime.now(timezone.utc)}}
     )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Wishlist not found")
     
     return {"message": "Item removed from wishlist"}
 
 # ============= ORDERS ROUTES =============
 
 @api_router.get("/orders", response_model=List[Order])
-async def get_orders(current_user: dict = Depends(get_current_user)):
-    orders = await db.orders.find({"user_id": current_user['id']}, {"_id": 0}).to_list(100)
-    
-    for order in orders:
-        if isinstance(order.get('created_at'), str):
-            order['created_at'] = datetime.fromisoformat(order['created_at'])
+async def get_orders(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    orders, next_cursor = await fetch_page(
+        db.orders, {"user_id": current_user['id']}, limit, cursor, projection=projection(Order)
+    )
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
     
-    return orders
+    return list_response(response, orders, Order)
 
 @api_router.post("/orders/create")
 async def create_order(order_data: OrderCreate, current_user: dict = Depends(get_current_user)):
+    # Merge repeated lines; the client's names, prices and total are not trusted
+    quantities = {}
+    for item in order_data.items:
+        if item.quantity < 1:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Quantities must be at least 1")
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    if not quantities:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Order has no items")
+    
+    # Re-price from the database, not the product cache
+    products = await db.products.find(
+        {"id": {"$in": list(quantities)}},
+        {"_id": 0, "id": 1, "name": 1, "price": 1, "discount_price": 1, "stock": 1}
+    ).to_list(None)
+    products = {product['id']: product for product in products}
+    
+    def unavailable(product_ids: list) -> dict:
+        return {
+            "message": "Some items are unavailable",
+            "items": [{
+                "product_id": product_id,
+                "requested": quantities[product_id],
+                "available": products[product_id].get('stock', 0) if product_id in products else 0,
+                "reason": "insufficient_stock" if product_id in products else "not_found"
+            } for product_id in product_ids]
+        }
+    
+    short = [pid for pid in quantities if pid not in products or products[pid].get('stock', 0) < quantities[pid]]
+    if short:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=unavailable(short))
+    
+    items = [
+        OrderItem(
+            product_id=product_id,
+            product_name=products[product_id]['name'],
+            quantity=quantity,
+            price=unit_price(products[product_id])
+        )
+        for product_id, quantity in quantities.items()
+    ]
+    subtotal = sum(item.price * item.quantity for item in items)
     order = Order(
         user_id=current_user['id'],
-        items=order_data.items,
-        total_amount=order_data.total_amount,
+        items=items,
+        total_amount=subtotal + delivery_charge(subtotal),
         shipping_address=order_data.shipping_address
     )
     
-    order_dict = order.model_dump()
-    order_dict['created_at'] = order_dict['created_at'].isoformat()
+    # Take stock for every line at once; anything short means nothing was taken
+    failed = await reserve_stock(db, order.id, quantities)
+    if failed:
+        stock = await db.products.find({"id": {"$in": failed}}, {"_id": 0, "id": 1, "stock": 1}).to_list(None)
+        for product in stock:
+            products[product['id']]['stock'] = product.get('stock', 0)
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=unavailable(failed))
     
-    await db.orders.insert_one(order_dict)
+    try:
+        await db.orders.insert_one(order.model_dump())
+    except Exception:
+        await release_stock(db, order.id, quantities)
+        raise
+    await commit_stock(db, order.id, list(quantities))
+    await increment_stats(db, total_orders=1)
+    await forget_products(list(quantities))
     
     # Clear cart after order
     await db.carts.update_one(
         {"user_id": current_user['id']},
-        {"$set": {"items": [], "updated_at": datetime.now().isoformat()}}
+        {"$set": {"items": [], "updated_at": datetime.now(timezone.utc)}}
     )
     
     return order
 
 # ============= RAZORPAY ROUTES =============
 
+async def linked_gateway_order(razorpay_order_id: str) -> dict:
+    try:
+        gateway_order = await razorpay_client.fetch_order(razorpay_order_id)
+    except GatewayUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except PaymentGatewayError as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(e))
+    if gateway_order.get('status') == "paid":
+        # The webhook or reconciler will mark the order paid; don't let the customer pay twice
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Order already paid")
+    return gateway_order
+
 @api_router.post("/payment/create-order")
-async def create_payment_order(amount: float, current_user: dict = Depends(get_current_user)):
+async def create_payment_order(
+    amount: Optional[float] = None,
+    order_id: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
     if not razorpay_client:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Payment gateway not configured. Please add Razorpay keys."
         )
     
+    if order_id:
+        # Charge the order's server-computed total and link the gateway order to it for webhooks
+        order = await db.orders.find_one(
+            {"id": order_id, "user_id": current_user['id']},
+            {"_id": 0, "total_amount": 1, "payment_status": 1, "razorpay_order_id": 1}
+        )
+        if not order:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Order not found")
+        if order.get('payment_status') == "success":
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Order already paid")
+        if order.get('payment_status') in ("failed", "refund_due"):
+            # Its stock has been put back; paying now could sell items that are gone
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Order expired, please place it again")
+        # Retries reuse the gateway order already issued, so webhooks and the reconciler
+        # only ever have to match one id per order
+        if order.get('razorpay_order_id'):
+            return await linked_gateway_order(order['razorpay_order_id'])
+        amount = order['total_amount']
+    elif amount is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Provide order_id or amount")
+    
     try:
         # Amount should be in paise (multiply by 100)
-        order = razorpay_client.order.create({
-            "amount": int(amount * 100),
-            "currency": "INR",
-            "payment_capture": 1
-        })
-        return order
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+        gateway_order = await razorpay_client.create_order(round(amount * 100), receipt=order_id)
+    except GatewayUnavailable as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except PaymentGatewayError as e:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=str(e))
+    
+    if order_id:
+        linked = await db.orders.update_one(
+            {"id": order_id, "razorpay_order_id": {"$exists": False}},
+            {"$set": {"razorpay_order_id": gateway_order['id']}}
+        )
+        if not linked.modified_count:
+            # A concurrent request linked its gateway order first; the one just created goes unused
+            order = await db.orders.find_one({"id": order_id}, {"_id": 0, "razorpay_order_id": 1})
+            return await linked_gateway_order(order['razorpay_order_id'])
+    return gateway_order
 
 @api_router.post("/payment/verify")
 async def verify_payment(
@@ -432,35 +796,71 @@ async def verify_payment(
             detail="Payment gateway not configured"
         )
     
-    try:
-        # Verify payment signature
-        razorpay_client.utility.verify_payment_signature({
-            'razorpay_order_id': order_id,
-            'razorpay_payment_id': payment_id,
-            'razorpay_signature': signature
-        })
-        
-        # Update order payment status
-        await db.orders.update_one(
-            {"id": order_id, "user_id": current_user['id']},
-            {"$set": {"payment_id": payment_id, "payment_status": "success"}}
-        )
-        
-        return {"message": "Payment verified successfully"}
-    except Exception as e:
+    # Verify payment signature
+    if not razorpay_client.verify_payment_signature(order_id, payment_id, signature):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Payment verification failed")
+    
+    # Update order payment status, counting revenue only on the first successful verification
+    match = {"$or": [{"id": order_id}, {"razorpay_order_id": order_id}], "user_id": current_user['id']}
+    order = await db.orders.find_one_and_update(
+        {**match, "payment_status": "pending"},
+        {"$set": {"payment_id": payment_id, "payment_status": "success"}},
+        projection={"_id": 0, "total_amount": 1}
+    )
+    if order:
+        await increment_stats(db, total_revenue=order.get('total_amount', 0))
+        return {"message": "Payment verified successfully"}
+    
+    # Paid after the order expired and its stock went back
+    expired = await db.orders.find_one(
+        {**match, "payment_status": {"$in": ["failed", "refund_due"]}},
+        {"_id": 0, "id": 1, "items": 1, "payment_status": 1}
+    )
+    if expired:
+        settled = expired['payment_status']
+        if settled == "failed":
+            settled = await settle_expired_order(db, expired['id'], payment_id)
+        if settled == "refund_due":
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Order expired and its items are no longer available; the payment will be refunded"
+            )
+        await forget_products([item['product_id'] for item in expired.get('items', [])])
+    
+    return {"message": "Payment verified successfully"}
+
+@api_router.post("/payment/webhook")
+async def payment_webhook(request: Request):
+    if not RAZORPAY_WEBHOOK_SECRET:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Payment webhooks not configured")
+    
+    body = await request.body()
+    if not verify_webhook_signature(body, request.headers.get("X-Razorpay-Signature"), RAZORPAY_WEBHOOK_SECRET):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid webhook signature")
+    
+    # Queue and acknowledge; the worker applies it to the order
+    entry = parse_webhook(body, request.headers.get("X-Razorpay-Event-Id"))
+    if entry and await enqueue_event(db, entry):
+        payment_worker.notify()
+    
+    return {"status": "ok"}
 
 # ============= REVIEWS ROUTES =============
 
 @api_router.get("/reviews/{product_id}", response_model=List[Review])
-async def get_reviews(product_id: str):
-    reviews = await db.reviews.find({"product_id": product_id}, {"_id": 0}).to_list(100)
-    
-    for review in reviews:
-        if isinstance(review.get('created_at'), str):
-            review['created_at'] = datetime.fromisoformat(review['created_at'])
+async def get_reviews(
+    product_id: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    reviews, next_cursor = await fetch_page(
+        db.reviews, {"product_id": product_id}, limit, cursor, projection=projection(Review)
+    )
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
     
-    return reviews
+    return list_response(response, reviews, Review)
 
 @api_router.post("/reviews", response_model=Review)
 async def create_review(review_data: ReviewCreate, current_user: dict = Depends(get_current_user)):
@@ -473,43 +873,37 @@ async def create_review(review_data: ReviewCreate, current_user: dict = Depends(
     )
     
     review_dict = review.model_dump()
-    review_dict['created_at'] = review_dict['created_at'].isoformat()
     
     await db.reviews.insert_one(review_dict)
     
     # Update product rating
-    reviews = await db.reviews.find({"product_id": review_data.product_id}, {"_id": 0}).to_list(1000)
-    avg_rating = sum(r['rating'] for r in reviews) / len(reviews) if reviews else 0
-    
-    await db.products.update_one(
-        {"id": review_data.product_id},
-        {"$set": {"rating": avg_rating, "reviews_count": len(reviews)}}
-    )
+    await db.products.update_one({"id": review_data.product_id}, add_rating_update(review.rating))
+    product_cache.pop(review_data.product_id)
+    catalog_cache.invalidate("product", review_data.product_id)
     
     return review
 
 # ============= BLOG ROUTES =============
 
 @api_router.get("/blogs", response_model=List[BlogPost])
-async def get_blogs(limit: int = 10):
-    blogs = await db.blogs.find({}, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+async def get_blogs(request: Request, limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE)):
+    cached = catalog_cache.get("blogs", limit)
+    if cached is None:
+        blogs = await db.blogs.find({}, {"_id": 0}).sort("created_at", -1).limit(limit).to_list(limit)
+        cached = catalog_cache.put("blogs", limit, blogs, List[BlogPost])
     
-    for blog in blogs:
-        if isinstance(blog.get('created_at'), str):
-            blog['created_at'] = datetime.fromisoformat(blog['created_at'])
-    
-    return blogs
+    return catalog_cache.respond(request, cached)
 
 @api_router.get("/blogs/{blog_id}", response_model=BlogPost)
-async def get_blog(blog_id: str):
-    blog = await db.blogs.find_one({"id": blog_id}, {"_id": 0})
-    if not blog:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Blog not found")
-    
-    if isinstance(blog.get('created_at'), str):
-        blog['created_at'] = datetime.fromisoformat(blog['created_at'])
-    
-    return blog
+async def get_blog(blog_id: str, request: Request):
+    cached = catalog_cache.get("blog", blog_id)
+    if cached is None:
+        blog = await db.blogs.find_one({"id": blog_id}, {"_id": 0})
+        if not blog:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Blog not found")
+        cached = catalog_cache.put("blog", blog_id, blog, BlogPost)
+    
+    return catalog_cache.respond(request, cached)
 
 @api_router.post("/blogs", response_model=BlogPost)
 async def create_blog(blog_data: BlogPostCreate, current_user: dict = Depends(get_current_user)):
@@ -518,9 +912,9 @@ async def create_blog(blog_data: BlogPostCreate, current_user: dict = Depends(ge
     
     blog = BlogPost(**blog_data.model_dump())
     blog_dict = blog.model_dump()
-    blog_dict['created_at'] = blog_dict['created_at'].isoformat()
     
     await db.blogs.insert_one(blog_dict)
+    catalog_cache.invalidate("blogs", all_keys=True)
     return blog
 
 # ============= ADMIN ROUTES =============
@@ -530,33 +924,95 @@ async def get_admin_stats(current_user: dict = Depends(get_current_user)):
     if not current_user.get('is_admin'):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     
-    total_products = await db.products.count_documents({})
-    total_orders = await db.orders.count_documents({})
-    total_users = await db.users.count_documents({})
-    
-    # Calculate total revenue
-    orders = await db.orders.find({"payment_status": "success"}, {"_id": 0}).to_list(10000)
-    total_revenue = sum(order.get('total_amount', 0) for order in orders)
+    return await admin_stats.get(db)
+
+@api_router.post("/admin/stats/rebuild")
+async def rebuild_admin_stats(current_user: dict = Depends(get_current_user)):
+    if not current_user.get('is_admin'):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     
-    return {
-        "total_products": total_products,
-        "total_orders": total_orders,
-        "total_users": total_users,
-        "total_revenue": total_revenue
-    }
+    stats = await rebuild_stats(db)
+    admin_stats.invalidate()
+    return stats
 
 @api_router.get("/admin/orders", response_model=List[Order])
-async def get_all_orders(current_user: dict = Depends(get_current_user)):
+async def get_all_orders(
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
     if not current_user.get('is_admin'):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     
-    orders = await db.orders.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
+    orders, next_cursor = await fetch_page(db.orders, {}, limit, cursor, projection=projection(Order))
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    
+    return list_response(response, orders, Order)
+
+@api_router.get("/admin/orders/export")
+async def export_orders(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    order_status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if not current_user.get('is_admin'):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
     
-    for order in orders:
-        if isinstance(order.get('created_at'), str):
-            order['created_at'] = datetime.fromisoformat(order['created_at'])
+    query = order_export_query(start, end, order_status, payment_status)
+    cursor = db.orders.find(query, {"_id": 0}).sort([("created_at", 1), ("id", 1)]).batch_size(EXPORT_BATCH_SIZE)
     
-    return orders
+    if format == "csv":
+        body, media_type = csv_chunks(cursor, ORDER_CSV_FIELDS), "text/csv"
+    else:
+        body, media_type = ndjson_chunks(cursor), "application/x-ndjson"
+    
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="orders.{format}"'}
+    )
+
+async def _imported_products(products: list):
+    for product in products:
+        product_cache.pop(product['id'])
+        catalog_cache.invalidate("product", product['id'])
+        product_search.add(product)
+    catalog_cache.invalidate("facets", all_keys=True)
+
+@api_router.post("/admin/products/import")
+async def import_products_route(
+    request: Request,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    batch_size: int = Query(IMPORT_BATCH_SIZE, ge=1, le=10000),
+    dry_run: bool = False,
+    current_user: dict = Depends(get_current_user)
+):
+    if not current_user.get('is_admin'):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    
+    # Rows are parsed off the request stream, so the upload is never held in memory
+    reader = csv_rows if format == "csv" else ndjson_rows
+    report = await import_products(
+        db, reader(request.stream()), batch_size, dry_run,
+        on_batch=_imported_products if not dry_run else None
+    )
+    recent_imports.appendleft({
+        **report.summary(), "format": format, "dry_run": dry_run,
+        "finished_at": datetime.now(timezone.utc), "by": current_user['id']
+    })
+    return report.as_dict()
+
+@api_router.get("/admin/products/imports")
+async def get_recent_imports(current_user: dict = Depends(get_current_user)):
+    if not current_user.get('is_admin'):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    
+    return list(recent_imports)
 
 @api_router.put("/admin/orders/{order_id}/status")
 async def update_order_status(order_id: str, order_status: str, current_user: dict = Depends(get_current_user)):
@@ -573,6 +1029,56 @@ async def update_order_status(order_id: str, order_status: str, current_user: di
     
     return {"message": "Order status updated"}
 
+@api_router.get("/admin/caches")
+async def get_cache_stats(current_user: dict = Depends(get_current_user)):
+    if not current_user.get('is_admin'):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    
+    return {"users": user_cache.stats(), "products": product_cache.stats(), "catalog": catalog_cache.stats()}
+
+@api_router.get("/admin/hashing")
+async def get_hashing_stats(current_user: dict = Depends(get_current_user)):
+    if not current_user.get('is_admin'):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    
+    return password_hasher.stats()
+
+@api_router.get("/admin/payments")
+async def get_payment_gateway_stats(current_user: dict = Depends(get_current_user)):
+    if not current_user.get('is_admin'):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    
+    return {
+        "gateway": razorpay_client.stats() if razorpay_client else {"configured": False},
+        "webhooks": {
+            **payment_worker.stats(),
+            "queued": await db.payment_events.count_documents({"processed_at": None})
+        },
+        "reconciler": payment_reconciler.stats() if payment_reconciler else {"configured": False}
+    }
+
+@api_router.get("/admin/indexes")
+async def get_index_report(current_user: dict = Depends(get_current_user)):
+    if not current_user.get('is_admin'):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    
+    routes = await explain_route_queries(db)
+    
+    return {
+        "index_stats": await index_stats(db),
+        "routes": routes,
+        "collection_scans": [r['route'] for r in routes if r['collection_scan']]
+    }
+
+@api_router.get("/admin/slow-queries")
+async def get_slow_queries(limit: int = Query(100, ge=1, le=1000), current_user: dict = Depends(get_current_user)):
+    if not current_user.get('is_admin'):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    
+    if not slow_queries:
+        return {"enabled": False}
+    return {"enabled": True, **slow_queries.report(limit)}
+
 # ============= ROOT ROUTE =============
 
 @api_router.get("/")
@@ -582,21 +1088,64 @@ async def root():
 # Include the router in the main app
 app.include_router(api_router)
 
+# Per-client budgets (requests per minute) for the routes that cost the most per call
+rate_limiter = RateLimiter(
+    [
+        RouteBudget("login", "POST", "/api/auth/login", float(os.getenv("RATE_LIMIT_LOGIN", "10"))),
+        RouteBudget("register", "POST", "/api/auth/register", float(os.getenv("RATE_LIMIT_REGISTER", "5"))),
+        # Webhooks come from Razorpay's servers and are already deduplicated
+        RouteBudget("payment", "POST", "/api/payment/", float(os.getenv("RATE_LIMIT_PAYMENT", "30")),
+                    prefix=True, exclude=("/api/payment/webhook",)),
+        RouteBudget("search", "GET", "/api/products", float(os.getenv("RATE_LIMIT_SEARCH", "120")),
+                    query_param="search", unless_params=("category", "brand", "min_price", "max_price")),
+    ],
+    # Keyed by the peer address; turn off behind a proxy until uvicorn runs with --proxy-headers,
+    # or every anonymous caller shares the proxy's bucket
+    limit_by_ip=os.getenv("RATE_LIMIT_BY_IP", "true").lower() == "true"
+) if os.getenv("RATE_LIMITS_ENABLED", "true").lower() == "true" else None
+
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "100"))
+concurrency_limiter = ConcurrencyLimiter(
+    MAX_CONCURRENT_REQUESTS,
+    max_queue=int(os.getenv("ADMISSION_QUEUE_SIZE", "100")),
+    queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "1"))
+) if MAX_CONCURRENT_REQUESTS > 0 else None
+
+# Inside CORS so rejections still carry CORS headers and preflights are never limited
+app.add_middleware(
+    AdmissionMiddleware,
+    rate_limiter=rate_limiter,
+    concurrency=concurrency_limiter,
+    exempt_paths=("/healthz", "/readyz", "/metrics")
+)
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Retry-After"],
 )
+# Added last so it is outermost and times everything, CORS preflights included
+app.add_middleware(MetricsMiddleware)
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    # Liveness only: the event loop is answering. Database trouble is reported by /readyz
+    return {"status": "ok"}
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+@app.get("/readyz", include_in_schema=False)
+async def readyz(response: Response):
+    if app_status != "ready":
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": app_status}
+    try:
+        ping_ms = await ping(client, READY_PING_TIMEOUT)
+    except Exception as exc:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+        return {"status": "unavailable", "mongo": repr(exc)}
+    return {"status": "ready", "mongo": {"ping_ms": round(ping_ms, 2), "pool": mongo_pool_metrics.snapshot()}}
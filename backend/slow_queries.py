@@ -0,0 +1,220 @@
+"""Opt-in slow-query log for commands issued by request handlers.
+
+SlowQueryRecorder is a pymongo CommandListener. Reads and writes slower than
+the threshold are kept in a ring buffer with the query's shape: the filter,
+pipeline or update with every literal replaced by "?", so the log never holds
+customer data. The first time a shape is seen its command is re-run as
+explain("executionStats") on the event loop, and the plan summary is shared
+by every entry with that shape. Commands from background work (workers,
+startup) are ignored.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo import monitoring
+
+from indexes import plan_stages
+from metrics import current_route
+
+logger = logging.getLogger(__name__)
+
+RECORDED_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+# Added by the driver; explain rejects most of them
+DRIVER_FIELDS = {"lsid", "txnNumber", "readConcern", "writeConcern", "apiVersion", "apiStrict",
+                 "apiDeprecationErrors", "autocommit", "startTransaction"}
+MAX_SHAPES = 1000
+
+def redact(value):
+    """The shape of a query value: literals become "?", field paths and keys are kept."""
+    if isinstance(value, dict):
+        return {key: redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # {"$in": [...]} collapses to one placeholder; $or/$and branches and pipeline stages are kept
+        if value and all(isinstance(item, dict) for item in value):
+            return [redact(item) for item in value]
+        return ["?"] if value else []
+    if isinstance(value, str) and value.startswith("$"):
+        return value
+    return "?"
+
+def command_shape(command_name: str, command: dict) -> dict:
+    if command_name == "aggregate":
+        return {"pipeline": redact(command.get("pipeline", []))}
+    if command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes", [])
+        first = statements[0] if statements else {}
+        shape = {"filter": redact(first.get("q", {})), "statements": len(statements)}
+        if command_name == "update":
+            update = first.get("u", {})
+            shape["update"] = sorted(update) if isinstance(update, dict) else "pipeline"
+        return shape
+    shape = {"filter": redact(command.get("filter", command.get("query", {})))}
+    if command.get("sort"):
+        shape["sort"] = dict(command["sort"])
+    if command_name == "findAndModify":
+        shape["update"] = sorted(command.get("update") or {})
+    return shape
+
+def _explain_command(command_name: str, command: dict) -> Optional[dict]:
+    body = {key: value for key, value in command.items() if key not in DRIVER_FIELDS and not key.startswith("$")}
+    if command_name == "aggregate" and any("$out" in stage or "$merge" in stage for stage in body.get("pipeline", [])):
+        return None
+    # Bulk writes arrive as one command; the first statement stands for the batch
+    for field in ("updates", "deletes"):
+        if body.get(field):
+            body[field] = body[field][:1]
+    return {"explain": body, "verbosity": "executionStats"}
+
+def _query_planner(explain: dict) -> Optional[tuple]:
+    if "queryPlanner" in explain:
+        return explain["queryPlanner"], explain.get("executionStats", {})
+    # Aggregations that aren't fully pushed down report the plan under the first $cursor stage
+    for stage in explain.get("stages", []):
+        if "$cursor" in stage:
+            return stage["$cursor"].get("queryPlanner", {}), stage["$cursor"].get("executionStats", {})
+    return None
+
+def plan_summary(explain: dict) -> dict:
+    found = _query_planner(explain)
+    if found is None:
+        return {"stages": [], "collection_scan": False}
+    planner, execution = found
+    winning = planner.get("winningPlan", {})
+    # The slot-based engine nests the classic plan under queryPlan
+    winning = winning.get("queryPlan", winning)
+    stages = [stage for stage in plan_stages(winning) if stage]
+    return {
+        "stages": stages,
+        "collection_scan": "COLLSCAN" in stages,
+        "index": next((scan.get("indexName") for scan in _index_scans(winning)), None),
+        "execution_ms": execution.get("executionTimeMillis"),
+        "returned": execution.get("nReturned"),
+        "keys_examined": execution.get("totalKeysExamined"),
+        "docs_examined": execution.get("totalDocsExamined")
+    }
+
+def _index_scans(plan: dict):
+    if plan.get("stage") == "IXSCAN":
+        yield plan
+    if "inputStage" in plan:
+        yield from _index_scans(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        yield from _index_scans(child)
+
+class SlowQueryRecorder(monitoring.CommandListener):
+    def __init__(self, threshold_ms: float = 100.0, capacity: int = 200):
+        self.threshold_ms = threshold_ms
+        self.entries = deque(maxlen=capacity)
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self._pending = {}
+        # shape key -> plan summary, or None while its explain is queued
+        self._plans = {}
+        self._db = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def started(self, event):
+        if event.command_name not in RECORDED_COMMANDS:
+            return
+        route = current_route()
+        if route == "background":
+            return
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (event.command, event.database_name, route)
+
+    def succeeded(self, event):
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending and event.duration_micros >= self.threshold_ms * 1000:
+            self._record(event, *pending)
+
+    def failed(self, event):
+        with self._lock:
+            self._pending.pop((event.connection_id, event.request_id), None)
+
+    def _record(self, event, command: dict, database: str, route: str):
+        command_name = event.command_name
+        collection = command.get(command_name)
+        shape = command_shape(command_name, command)
+        key = json.dumps([collection, command_name, shape], sort_keys=True, default=str)
+        self.entries.append({
+            "at": datetime.now(timezone.utc),
+            "route": route,
+            "collection": collection,
+            "command": command_name,
+            "duration_ms": round(event.duration_micros / 1000, 2),
+            "shape": shape,
+            "key": key
+        })
+        with self._lock:
+            self.recorded += 1
+            first_seen = key not in self._plans and len(self._plans) < MAX_SHAPES
+            if first_seen:
+                self._plans[key] = None
+        if first_seen and self._loop is not None:
+            explain = _explain_command(command_name, command)
+            if explain:
+                # Listeners run on Motor's executor threads; explains run on the loop
+                self._loop.call_soon_threadsafe(self._queue.put_nowait, (key, database, explain))
+
+    async def _run(self):
+        while True:
+            key, database, explain = await self._queue.get()
+            try:
+                result = await self._db.client[database].command(explain)
+                self._plans[key] = plan_summary(result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning(f"Explain for slow query failed: {exc}")
+                self._plans[key] = {"error": str(exc)}
+
+    def start(self, db):
+        self._db = db
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def report(self, limit: int = 100) -> dict:
+        entries = list(self.entries)
+        shapes = {}
+        for entry in entries:
+            summary = shapes.setdefault(entry['key'], {
+                "collection": entry['collection'],
+                "command": entry['command'],
+                "shape": entry['shape'],
+                "routes": set(),
+                "count": 0,
+                "max_ms": 0.0,
+                "plan": self._plans.get(entry['key'])
+            })
+            summary['routes'].add(entry['route'])
+            summary['count'] += 1
+            summary['max_ms'] = max(summary['max_ms'], entry['duration_ms'])
+        for summary in shapes.values():
+            summary['routes'] = sorted(summary['routes'])
+        recent = [
+            {**{k: v for k, v in entry.items() if k != "key"}, "plan": self._plans.get(entry['key'])}
+            for entry in reversed(entries[-limit:])
+        ]
+        return {
+            "threshold_ms": self.threshold_ms,
+            "recorded": self.recorded,
+            "shapes": sorted(shapes.values(), key=lambda s: s['count'] * s['max_ms'], reverse=True),
+            "recent": recent
+        }
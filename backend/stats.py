@@ -0,0 +1,60 @@
+import time
+from datetime import datetime, timezone
+
+STATS_ID = "dashboard"
+STATS_FIELDS = ("total_products", "total_orders", "total_users", "total_revenue")
+
+async def rebuild_stats(db) -> dict:
+    """Recompute the dashboard counters from scratch and store them."""
+    facets = await db.orders.aggregate([
+        {"$facet": {
+            "orders": [{"$count": "count"}],
+            "revenue": [
+                {"$match": {"payment_status": "success"}},
+                {"$group": {"_id": None, "total": {"$sum": "$total_amount"}}}
+            ]
+        }}
+    ]).to_list(1)
+    facets = facets[0] if facets else {}
+
+    stats = {
+        "total_products": await db.products.count_documents({}),
+        "total_orders": facets['orders'][0]['count'] if facets.get('orders') else 0,
+        "total_users": await db.users.count_documents({}),
+        "total_revenue": facets['revenue'][0]['total'] if facets.get('revenue') else 0
+    }
+    await db.stats.update_one(
+        {"_id": STATS_ID},
+        {"$set": {**stats, "rebuilt_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    return stats
+
+async def increment_stats(db, **deltas):
+    await db.stats.update_one({"_id": STATS_ID}, {"$inc": deltas}, upsert=True)
+
+class StatsCache:
+    """Short-lived in-process cache in front of the materialized stats document."""
+
+    def __init__(self, ttl: float = 10.0):
+        self.ttl = ttl
+        self._stats = None
+        self._expires_at = 0.0
+
+    async def get(self, db) -> dict:
+        if self._stats is not None and time.monotonic() < self._expires_at:
+            return self._stats
+
+        doc = await db.stats.find_one({"_id": STATS_ID})
+        if not doc or "rebuilt_at" not in doc:
+            # Never built, or only holds increments made before the first rebuild
+            stats = await rebuild_stats(db)
+        else:
+            stats = {field: doc.get(field, 0) for field in STATS_FIELDS}
+
+        self._stats = stats
+        self._expires_at = time.monotonic() + self.ttl
+        return stats
+
+    def invalidate(self):
+        self._stats = None
@@ -10,9 +10,10 @@ const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || 'https://web-constructo
 const API = `${BACKEND_URL}/api`;
 
 const Cart = () => {
-  const { user } = useAuth();
+  const { user, token } = useAuth();
   const { cart, removeFromCart, fetchCart } = useCart();
   const [products, setProducts] = useState([]);
+  const [totals, setTotals] = useState({ subtotal: 0, discount: 0, deliveryCharge: 0, freeDeliveryThreshold: 0, total: 0 });
   const [loading, setLoading] = useState(true);
   const navigate = useNavigate();
 
@@ -26,20 +27,29 @@ const Cart = () => {
 
   const fetchCartProducts = async () => {
     if (!cart.items || cart.items.length === 0) {
+      setProducts([]);
+      setTotals({ subtotal: 0, discount: 0, deliveryCharge: 0, freeDeliveryThreshold: 0, total: 0 });
       setLoading(false);
       return;
     }
 
     try {
-      const productPromises = cart.items.map(item =>
-        axios.get(`${API}/products/${item.product_id}`)
-      );
-      const responses = await Promise.all(productPromises);
-      const productsData = responses.map((res, index) => ({
-        ...res.data,
-        quantity: cart.items[index].quantity
-      }));
-      setProducts(productsData);
+      const response = await axios.get(`${API}/cart`, {
+        params: { hydrate: true },
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      // Lines come back joined with current product data; skip products that no longer exist
+      setProducts(response.data.items
+        .filter(item => item.name)
+        .map(item => ({ ...item, id: item.product_id })));
+      // Delivery and total are priced by the server, the same way checkout charges them
+      setTotals({
+        subtotal: response.data.subtotal,
+        discount: response.data.discount,
+        deliveryCharge: response.data.delivery_charge,
+        freeDeliveryThreshold: response.data.free_delivery_threshold,
+        total: response.data.total
+      });
     } catch (error) {
       console.error('Error fetching cart products:', error);
     } finally {
@@ -57,20 +67,7 @@ const Cart = () => {
     // Update cart quantity logic here
   };
 
-  const subtotal = products.reduce((sum, product) => {
-    const price = product.discount_price || product.price;
-    return sum + (price * product.quantity);
-  }, 0);
-
-  const discount = products.reduce((sum, product) => {
-    if (product.discount_price) {
-      return sum + ((product.price - product.discount_price) * product.quantity);
-    }
-    return sum;
-  }, 0);
-
-  const deliveryCharge = subtotal >= 500 ? 0 : 40;
-  const total = subtotal + deliveryCharge;
+  const { subtotal, discount, deliveryCharge, freeDeliveryThreshold, total } = totals;
 
   if (loading) {
     return (
@@ -174,8 +171,8 @@ const Cart = () => {
                       {deliveryCharge === 0 ? 'FREE' : `₹${deliveryCharge}`}
                     </span>
                   </div>
-                  {subtotal < 500 && (
-                    <p className="text-xs text-orange-600">Add ₹{(500 - subtotal).toFixed(2)} more for FREE delivery</p>
+                  {deliveryCharge > 0 && (
+                    <p className="text-xs text-orange-600">Add ₹{(freeDeliveryThreshold - subtotal).toFixed(2)} more for FREE delivery</p>
                   )}
                 </div>
                 <div className="flex justify-between text-lg font-bold mb-6">
@@ -8,6 +8,8 @@ import ProductCard from '../components/ProductCard';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || 'https://web-constructor-50.preview.emergentagent.com';
 const API = `${BACKEND_URL}/api`;
+// The batch endpoint takes at most this many ids per request (MAX_BATCH_IDS on the server)
+const BATCH_SIZE = 200;
 
 const Wishlist = () => {
   const { user } = useAuth();
@@ -31,11 +33,14 @@ const Wishlist = () => {
     }
 
     try {
-      const productPromises = wishlist.items.map(productId =>
-        axios.get(`${API}/products/${productId}`)
+      const chunks = [];
+      for (let i = 0; i < wishlist.items.length; i += BATCH_SIZE) {
+        chunks.push(wishlist.items.slice(i, i + BATCH_SIZE));
+      }
+      const responses = await Promise.all(
+        chunks.map((ids) => axios.post(`${API}/products/batch`, { ids }))
       );
-      const responses = await Promise.all(productPromises);
-      setProducts(responses.map(res => res.data));
+      setProducts(responses.flatMap((response) => response.data.products));
     } catch (error) {
       console.error('Error fetching wishlist products:', error);
     } finally {
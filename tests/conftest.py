@@ -0,0 +1,33 @@
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+# The backend is a flat set of modules that import each other by name
+sys.path.insert(0, str(BACKEND_DIR))
+
+@pytest.fixture
+def mock_mongo():
+    """An in-memory Motor-compatible client, for logic that doesn't need server-side features."""
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    return mongomock_motor.AsyncMongoMockClient(tz_aware=True)
+
+@pytest.fixture
+def live_mongo_url():
+    """MONGO_URL (default localhost) if a mongod answers there, with a scratch DB_NAME; skips otherwise."""
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    url = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+    probe = MongoClient(url, serverSelectionTimeoutMS=500)
+    try:
+        probe.admin.command("ping")
+    except PyMongoError:
+        pytest.skip(f"no mongod reachable at {url}")
+    db_name = f"test_{uuid.uuid4().hex[:8]}"
+    yield url, db_name
+    probe.drop_database(db_name)
+    probe.close()
@@ -0,0 +1,32 @@
+import asyncio
+
+from carts import hydrated_cart_pipeline, unit_price
+
+PRODUCTS = [
+    {"id": "discounted", "name": "A", "price": 100.0, "discount_price": 80.0, "stock": 5},
+    {"id": "zero-discount", "name": "B", "price": 100.0, "discount_price": 0, "stock": 5},
+    {"id": "null-discount", "name": "C", "price": 100.0, "discount_price": None, "stock": 5},
+    {"id": "no-discount", "name": "D", "price": 100.0, "stock": 5},
+]
+
+def test_cart_lines_are_priced_like_orders(live_mongo_url):
+    url, db_name = live_mongo_url
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    async def scenario():
+        client = AsyncIOMotorClient(url)
+        db = client[db_name]
+        await db.products.insert_many([dict(product) for product in PRODUCTS])
+        await db.carts.insert_one({"id": "cart-1", "user_id": "u-1",
+                                   "items": [{"product_id": product["id"], "quantity": 2} for product in PRODUCTS]})
+        carts = await db.carts.aggregate(hydrated_cart_pipeline("u-1")).to_list(1)
+        client.close()
+        return carts
+
+    [cart] = asyncio.run(scenario())
+    lines = {line["product_id"]: line for line in cart["items"]}
+    for product in PRODUCTS:
+        assert lines[product["id"]]["unit_price"] == unit_price(product)
+    assert lines["zero-discount"]["unit_price"] == 100.0 and lines["zero-discount"]["line_discount"] == 0
+    assert cart["subtotal"] == 2 * (80.0 + 100.0 * 3)
+    assert cart["discount"] == 40.0
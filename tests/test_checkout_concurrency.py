@@ -0,0 +1,37 @@
+import asyncio
+
+import httpx
+
+CHECKOUTS = 20
+STOCK = 5
+
+def test_concurrent_checkouts_never_oversell(live_mongo_url, monkeypatch):
+    url, db_name = live_mongo_url
+    monkeypatch.setenv("MONGO_URL", url)
+    monkeypatch.setenv("DB_NAME", db_name)
+    monkeypatch.setenv("MONGO_MIN_POOL_SIZE", "1")
+    import server
+    from auth import create_access_token
+
+    async def scenario():
+        async with server.app.router.lifespan_context(server.app):
+            db = server.db
+            await db.users.insert_one({"id": "buyer", "email": "buyer@example.com", "name": "Buyer", "is_admin": False})
+            await db.products.insert_one({"id": "last-few", "name": "Last few", "price": 100.0, "stock": STOCK})
+            headers = {"Authorization": f"Bearer {create_access_token({'user_id': 'buyer'})}"}
+            order = {"items": [{"product_id": "last-few", "quantity": 1}],
+                     "shipping_address": {"name": "Buyer", "city": "Pune", "pincode": "411001"}}
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                responses = await asyncio.gather(*(
+                    client.post("/api/orders/create", headers=headers, json=order) for _ in range(CHECKOUTS)
+                ))
+            return ([response.status_code for response in responses],
+                    await db.orders.count_documents({"user_id": "buyer"}),
+                    await db.products.find_one({"id": "last-few"}))
+
+    statuses, orders, product = asyncio.run(scenario())
+    assert sorted(statuses) == [200] * STOCK + [409] * (CHECKOUTS - STOCK)
+    assert orders == STOCK
+    assert product['stock'] == 0
+    assert not product.get('stock_holds')
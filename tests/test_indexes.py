@@ -0,0 +1,15 @@
+import asyncio
+
+from indexes import INDEXES, ensure_indexes
+
+def test_duplicates_skip_the_unique_index_but_not_the_rest(mock_mongo):
+    async def scenario():
+        db = mock_mongo["indexes"]
+        await db.users.insert_many([{"id": "u-1", "email": "a@example.com"}, {"id": "u-2", "email": "a@example.com"}])
+        failures = await ensure_indexes(db)
+        return failures, await db.users.index_information(), await db.products.index_information()
+
+    failures, user_indexes, product_indexes = asyncio.run(scenario())
+    assert [(collection, name) for collection, name, _ in failures] == [("users", "email_1")]
+    assert "id_1" in user_indexes and "email_1" not in user_indexes
+    assert len(product_indexes) == len(INDEXES["products"]) + 1
@@ -0,0 +1,50 @@
+import asyncio
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from pagination import decode_cursor, encode_cursor, fetch_page
+
+def _raw_cursor(values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def test_cursors_round_trip_datetimes():
+    when = datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert decode_cursor(encode_cursor([when, "order-1"]), 2) == [when, "order-1"]
+
+@pytest.mark.parametrize("values", [
+    [{"$date": "x"}, "a"],
+    [{"$date": 5}, "a"],
+    [{"$ne": None}, "a"],
+    [{"$date": "2025-01-01T00:00:00+00:00", "$gt": 1}, "a"],
+    [["nested"], "a"],
+    [True, "a"],
+    ["a"],
+    {"not": "a list"},
+])
+def test_malformed_cursors_are_rejected_with_400(values):
+    with pytest.raises(HTTPException) as exc:
+        decode_cursor(_raw_cursor(values), 2)
+    assert exc.value.status_code == 400
+
+def test_pages_reach_documents_missing_the_sort_field(mock_mongo):
+    async def scenario():
+        collection = mock_mongo["pagination"].orders
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        await collection.insert_many(
+            [{"id": f"order-{i}", "created_at": start + timedelta(minutes=i)} for i in range(5)]
+            + [{"id": f"legacy-{i}"} for i in range(3)]
+        )
+        seen, cursor = [], None
+        while True:
+            docs, cursor = await fetch_page(collection, {}, 3, cursor)
+            seen += [doc['id'] for doc in docs]
+            if not cursor:
+                return seen
+
+    assert asyncio.run(scenario()) == [
+        "order-4", "order-3", "order-2", "order-1", "order-0", "legacy-2", "legacy-1", "legacy-0"
+    ]
@@ -0,0 +1,184 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from payment_events import PaymentEventWorker, PaymentReconciler, apply_events
+from payments import GatewayUnavailable, PaymentGatewayError
+
+class FakeGateway:
+    def __init__(self, errors=None):
+        self.fetched = []
+        # {razorpay_order_id: exception to raise for it}
+        self.errors = errors or {}
+
+    async def fetch_order(self, razorpay_order_id: str) -> dict:
+        self.fetched.append(razorpay_order_id)
+        if razorpay_order_id in self.errors:
+            raise self.errors[razorpay_order_id]
+        return {"id": razorpay_order_id, "status": "attempted"}
+
+def test_sweeps_rotate_through_a_backlog_larger_than_the_batch(mock_mongo):
+    async def scenario():
+        db = mock_mongo["reconciler"]
+        created_at = datetime.now(timezone.utc) - timedelta(hours=1)
+        # Stale enough to check, but not old enough to expire, so every sweep leaves them pending
+        await db.orders.insert_many([
+            {"id": f"order-{i}", "razorpay_order_id": f"rzp-{i}", "payment_status": "pending",
+             "created_at": created_at + timedelta(seconds=i)}
+            for i in range(25)
+        ])
+        gateway = FakeGateway()
+        reconciler = PaymentReconciler(db, gateway, PaymentEventWorker(db), stale_after=60,
+                                       expire_after=86400, batch_size=10)
+        for _ in range(3):
+            await reconciler.sweep()
+        return gateway.fetched
+
+    fetched = asyncio.run(scenario())
+    assert len(fetched) == 30
+    assert set(fetched) == {f"rzp-{i}" for i in range(25)}
+    # The first 10 are only revisited once every other order has had a turn
+    assert fetched[:10] == [f"rzp-{i}" for i in range(10)]
+    assert fetched[25:] == [f"rzp-{i}" for i in range(5)]
+
+def test_events_for_unknown_gateway_orders_are_flagged_not_dropped(mock_mongo):
+    async def scenario():
+        db = mock_mongo["events"]
+        await db.orders.insert_one({"id": "order-1", "razorpay_order_id": "rzp-1", "payment_status": "pending"})
+        await db.payment_events.insert_one({"razorpay_order_id": "rzp-unknown", "payment_status": "success",
+                                            "payment_id": "pay-1"})
+        events = await db.payment_events.find({}).to_list(None)
+        result = await apply_events(db, events)
+        return result, await db.payment_events.find_one({}), await db.orders.find_one({"id": "order-1"})
+
+    result, event, order = asyncio.run(scenario())
+    assert result == (0, 1)
+    assert event['unmatched'] is True and event['processed_at']
+    assert order['payment_status'] == "pending"
+
+def test_a_failed_attempt_leaves_the_order_pending(mock_mongo):
+    async def scenario():
+        db = mock_mongo["failed-attempt"]
+        await db.orders.insert_one({"id": "order-1", "razorpay_order_id": "rzp-1", "payment_status": "pending"})
+        await db.payment_events.insert_one({"razorpay_order_id": "rzp-1", "payment_status": "failed",
+                                            "payment_id": "pay-1", "received_at": datetime.now(timezone.utc)})
+        await apply_events(db, await db.payment_events.find({}).to_list(None))
+        return await db.orders.find_one({"id": "order-1"})
+
+    order = asyncio.run(scenario())
+    assert order['payment_status'] == "pending"
+    assert order['last_failed_payment_id'] == "pay-1"
+
+def test_an_order_the_gateway_rejects_does_not_stall_the_sweeps(mock_mongo):
+    async def scenario():
+        db = mock_mongo["rejected"]
+        created_at = datetime.now(timezone.utc) - timedelta(hours=1)
+        await db.orders.insert_many([
+            {"id": f"order-{i}", "razorpay_order_id": f"rzp-{i}", "payment_status": "pending",
+             "created_at": created_at + timedelta(seconds=i)}
+            for i in range(4)
+        ])
+        gateway = FakeGateway({"rzp-0": PaymentGatewayError("The id provided does not exist")})
+        reconciler = PaymentReconciler(db, gateway, PaymentEventWorker(db), stale_after=60,
+                                       expire_after=86400, batch_size=2)
+        async def sweep():
+            await reconciler.sweep()
+            # Stored stamps have millisecond precision; keep each sweep's distinct
+            await asyncio.sleep(0.01)
+
+        for _ in range(2):
+            await sweep()
+        first = list(gateway.fetched)
+
+        # An unreachable gateway ends the sweep; the order it stopped on stays first in line
+        gateway.errors["rzp-1"] = GatewayUnavailable("circuit open")
+        await sweep()
+        del gateway.errors["rzp-1"]
+        await sweep()
+        return first, gateway.fetched[len(first):], reconciler.stats()
+
+    first, later, stats = asyncio.run(scenario())
+    assert first == ["rzp-0", "rzp-1", "rzp-2", "rzp-3"]
+    assert later == ["rzp-0", "rzp-1", "rzp-1", "rzp-2"]
+    assert stats["gateway_errors"] == 2 and stats["checked"] == 7
+
+def test_expired_orders_return_their_stock_once(mock_mongo):
+    async def scenario():
+        db = mock_mongo["expiry"]
+        await db.products.insert_many([{"id": "p-1", "stock": 3}, {"id": "p-2", "stock": 0}])
+        await db.orders.insert_one({
+            "id": "order-1", "razorpay_order_id": "rzp-1", "payment_status": "pending",
+            "created_at": datetime.now(timezone.utc) - timedelta(days=2),
+            "items": [{"product_id": "p-1", "quantity": 2}, {"product_id": "p-2", "quantity": 1}]
+        })
+        restocked = []
+
+        async def on_restock(product_ids):
+            restocked.extend(product_ids)
+
+        reconciler = PaymentReconciler(db, FakeGateway(), PaymentEventWorker(db), stale_after=60,
+                                       expire_after=86400, on_restock=on_restock)
+        await reconciler.sweep()
+        # A second reconciler (another process) racing on the same order must not restock again
+        await reconciler.expire("order-1")
+        stock = {product['id']: product['stock'] async for product in db.products.find({})}
+        return await db.orders.find_one({"id": "order-1"}), stock, restocked, reconciler.stats()
+
+    order, stock, restocked, stats = asyncio.run(scenario())
+    assert order['payment_status'] == "failed"
+    assert stock == {"p-1": 5, "p-2": 1}
+    assert sorted(restocked) == ["p-1", "p-2"]
+    assert stats["expired"] == 1
+
+def test_late_payments_retake_stock_or_are_flagged_for_refund(mock_mongo):
+    async def scenario():
+        db = mock_mongo["late"]
+        await db.products.insert_many([{"id": "in-stock", "stock": 1}, {"id": "sold-out", "stock": 0}])
+        await db.orders.insert_many([
+            {"id": f"order-{product_id}", "razorpay_order_id": f"rzp-{product_id}", "payment_status": "failed",
+             "total_amount": 100.0, "items": [{"product_id": product_id, "quantity": 1}]}
+            for product_id in ("in-stock", "sold-out")
+        ])
+        await db.payment_events.insert_many([
+            {"razorpay_order_id": f"rzp-{product_id}", "payment_status": "success", "payment_id": f"pay-{product_id}"}
+            for product_id in ("in-stock", "sold-out")
+        ])
+        updated, _ = await apply_events(db, await db.payment_events.find({}).to_list(None))
+        orders = {order['id']: order['payment_status'] async for order in db.orders.find({})}
+        stock = {product['id']: product['stock'] async for product in db.products.find({})}
+        return updated, orders, stock
+
+    updated, orders, stock = asyncio.run(scenario())
+    assert updated == 2
+    assert orders == {"order-in-stock": "success", "order-sold-out": "refund_due"}
+    assert stock == {"in-stock": 0, "sold-out": 0}
+
+def test_orders_never_sent_to_the_gateway_expire_by_age(mock_mongo):
+    async def scenario(gateway):
+        db = mock_mongo["unlinked"]
+        await db.drop_collection("orders")
+        await db.drop_collection("products")
+        await db.products.insert_one({"id": "p-1", "stock": 0})
+        old = datetime.now(timezone.utc) - timedelta(days=2)
+        await db.orders.insert_many([
+            {"id": "unlinked", "payment_status": "pending", "created_at": old,
+             "items": [{"product_id": "p-1", "quantity": 1}]},
+            {"id": "recent", "payment_status": "pending", "created_at": datetime.now(timezone.utc),
+             "items": [{"product_id": "p-1", "quantity": 1}]},
+            {"id": "linked", "razorpay_order_id": "rzp-1", "payment_status": "pending", "created_at": old,
+             "reconcile_checked_at": datetime.now(timezone.utc), "items": [{"product_id": "p-1", "quantity": 1}]},
+        ])
+        reconciler = PaymentReconciler(db, gateway, PaymentEventWorker(db), stale_after=60,
+                                       expire_after=86400, batch_size=1)
+        await reconciler.expire_unlinked(datetime.now(timezone.utc))
+        await reconciler.expire_unlinked(datetime.now(timezone.utc))
+        orders = {order['id']: order['payment_status'] async for order in db.orders.find({})}
+        return orders, (await db.products.find_one({"id": "p-1"}))['stock']
+
+    # With a gateway, linked orders are left to the gateway check
+    orders, stock = asyncio.run(scenario(FakeGateway()))
+    assert orders == {"unlinked": "failed", "recent": "pending", "linked": "pending"}
+    assert stock == 1
+    # Without one (no Razorpay keys), nothing can have been paid
+    orders, stock = asyncio.run(scenario(None))
+    assert orders == {"unlinked": "failed", "recent": "pending", "linked": "failed"}
+    assert stock == 2
@@ -0,0 +1,37 @@
+import asyncio
+import time
+
+from product_import import MAX_RECORD_LINES, csv_rows
+
+async def _chunks(data: bytes, size: int = 1 << 16):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+async def _collect(rows):
+    return [row async for row in rows]
+
+def test_a_stray_quote_fails_one_row_and_parsing_resumes():
+    lines = ["name,description,price,category"]
+    lines += [f"Product {i},Plain description {i},{i + 1},misc" for i in range(5000)]
+    lines[10] = 'Broken,"opens a quote and never closes it,5,misc'
+    lines[4000] = 'Quoted,"spans\na second line",7,misc'
+    data = "\n".join(lines).encode()
+
+    started = time.perf_counter()
+    rows = asyncio.run(_collect(csv_rows(_chunks(data))))
+    elapsed = time.perf_counter() - started
+
+    assert elapsed < 5
+    errors = [(number, row) for number, row in rows if isinstance(row, str)]
+    assert errors == [(10, "Unterminated quoted field")]
+    parsed = [row for _, row in rows if isinstance(row, dict)]
+    assert len(parsed) == 4999
+    assert parsed[9]["name"] == "Product 10"
+    assert {"name": "Quoted", "description": "spans\na second line", "price": "7", "category": "misc"} in parsed
+
+def test_an_unterminated_final_record_does_not_swallow_the_lines_after_it():
+    tail = [f"Product {i},d,1,misc" for i in range(MAX_RECORD_LINES // 2)]
+    data = "\n".join(["name,description,price,category", 'Broken,"open,1,misc', *tail]).encode()
+    rows = asyncio.run(_collect(csv_rows(_chunks(data))))
+    assert rows[0] == (1, "Unterminated quoted field")
+    assert [row["name"] for _, row in rows[1:]] == [f"Product {i}" for i in range(MAX_RECORD_LINES // 2)]
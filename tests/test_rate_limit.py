@@ -0,0 +1,30 @@
+import asyncio
+
+from auth import create_access_token
+from rate_limit import RateLimiter, RouteBudget
+
+LOGIN = {"type": "http", "method": "POST", "path": "/api/auth/login", "query_string": b"",
+         "headers": [], "client": ("10.0.0.1", 50000)}
+
+def over_budget(limiter: RateLimiter, scope: dict, attempts: int) -> int:
+    async def scenario():
+        return [await limiter.check(scope) for _ in range(attempts)]
+    return sum(1 for result in asyncio.run(scenario()) if result)
+
+def test_anonymous_callers_are_not_limited_by_ip_when_disabled():
+    limiter = RateLimiter([RouteBudget("login", "POST", "/api/auth/login", 3)], limit_by_ip=False)
+    assert over_budget(limiter, LOGIN, 10) == 0
+
+def test_anonymous_callers_are_limited_per_peer_address_by_default():
+    limiter = RateLimiter([RouteBudget("login", "POST", "/api/auth/login", 3)])
+    assert over_budget(limiter, LOGIN, 5) == 2
+    # X-Forwarded-For is left to uvicorn --proxy-headers; a spoofed header doesn't get a fresh bucket
+    spoofed = dict(LOGIN, headers=[(b"x-forwarded-for", b"203.0.113.9")])
+    assert over_budget(limiter, spoofed, 1) == 1
+
+def test_signed_in_users_are_limited_either_way():
+    token = create_access_token({"user_id": "u-1"})
+    scope = dict(LOGIN, path="/api/payment/create-order",
+                 headers=[(b"authorization", f"Bearer {token}".encode())])
+    limiter = RateLimiter([RouteBudget("payment", "POST", "/api/payment/", 3, prefix=True)])
+    assert over_budget(limiter, scope, 5) == 2
@@ -0,0 +1,54 @@
+import asyncio
+from types import SimpleNamespace
+
+from search import ProductSearchIndex
+
+def test_periodic_rebuilds_pick_up_products_written_elsewhere(mock_mongo):
+    async def scenario():
+        db = mock_mongo["search"]
+        await db.products.insert_one({"id": "p-1", "name": "Galaxy battery"})
+        index = ProductSearchIndex()
+        await index.build(db)
+        # Written by another worker or the import CLI
+        await db.products.insert_one({"id": "p-2", "name": "Galaxy charger"})
+        before = index.search("galaxy")
+        index.start(db, interval=0.01)
+        await asyncio.sleep(0.1)
+        await index.stop()
+        return before, index.search("galaxy")
+
+    before, after = asyncio.run(scenario())
+    assert before == ["p-1"]
+    assert sorted(after) == ["p-1", "p-2"]
+
+class _ScanningProducts:
+    """A products collection whose scan lets this worker's routes write to the index midway."""
+
+    def __init__(self, index, products):
+        self.index = index
+        self.products = products
+
+    def find(self, *args):
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    async def __aiter__(self):
+        yield self.products[0]
+        # A route on this worker deletes one product and edits another while the scan runs
+        self.index.remove("p-2")
+        self.index.add({"id": "p-1", "name": "Galaxy battery XL"})
+        for product in self.products[1:]:
+            yield product
+
+def test_writes_made_during_a_rebuild_survive_the_swap():
+    async def scenario():
+        index = ProductSearchIndex()
+        products = [{"id": "p-1", "name": "Galaxy battery"}, {"id": "p-2", "name": "Galaxy charger"}]
+        await index.build(SimpleNamespace(products=_ScanningProducts(index, products)))
+        return index.search("galaxy"), index.search("xl")
+
+    galaxy, xl = asyncio.run(scenario())
+    assert galaxy == ["p-1"]
+    assert xl == ["p-1"]
@@ -0,0 +1,19 @@
+import statistics
+
+import bench_startup
+
+RUNS = 3
+
+def test_import_stays_within_budget_and_defers_lazy_modules():
+    # The first import also writes .pyc files; don't count it
+    bench_startup.import_once()
+    ratios, loaded = [], set()
+    for _ in range(RUNS):
+        rows, lazy_loaded = bench_startup.import_once()
+        loaded.update(lazy_loaded)
+        ratios.append(bench_startup.reference_ratio(rows))
+
+    assert not loaded, f"loaded at import, expected on first use: {sorted(loaded)}"
+    # Relative to fastapi's own import in the same run, so a loaded machine doesn't fail it
+    assert statistics.median(ratios) <= bench_startup.IMPORT_BUDGET_RATIO, \
+        f"import server took {statistics.median(ratios):.2f}x the fastapi import (runs: {ratios})"